@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+'''
+Command benchmark, builds TPM format stores of different sizes and runs
+tpass commands end to end through click's CliRunner against the simulated
+device. Every run is a fresh interpreter, wall time, device round trips and
+peak RSS are reported, results past the baseline fail the benchmark
+
+    python benchmark/commands.py [--sizes 100,1000,10000] [--runs N] [--json]
+        [--baseline benchmark/baseline.json] [--update-baseline] [--tolerance 0.5]
+'''
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src import crypto
+from src import simulator
+
+BASELINE_FILE = os.path.join(ROOT, 'benchmark', 'baseline.json')
+# warm commands run after an unlock wrote the metadata cache
+COMMANDS = {
+    'unlock': {'args': ['unlock'], 'warm': False},
+    'list': {'args': ['list'], 'warm': True},
+    'find': {'args': ['find', 'mail'], 'warm': True},
+    'grep': {'args': ['grep', '-i', 'recovery'], 'warm': True},
+    'save': {'args': ['insert', '-d', '--title', 'benchmark.example.com', '--user', 'bench', '--pwd', 'pwd', '--secret', 'secret'], 'warm': True},
+    'export': {'args': ['export', '-f', 'jsonl', '-p', '{home}/export.jsonl'], 'warm': True},
+    'import': {'args': ['import', '{home}/import.jsonl'], 'warm': True},
+}
+TAGS = ['Social', 'Work', 'Banking', 'Shopping', 'Mail', 'Games', 'Travel', 'Crypto', 'Family', 'Cloud', 'News', 'Dev', 'Health', 'Wifi', 'Media']
+ICONS = ['person-stalker', 'settings', 'card', 'android-cart', 'email', 'star', 'earth', 'social-bitcoin', 'heart', 'cloud', 'flag', 'image', 'alert-circled', 'wifi', 'person']
+WORDS = ['mail', 'cloud', 'shop', 'bank', 'forum', 'wiki', 'photo', 'music', 'video', 'news', 'chat', 'code', 'game', 'travel', 'health', 'home']
+TLDS = ['com', 'org', 'net', 'io', 'de', 'co.uk']
+# the child imports tpass after HOME points to the benchmark store
+CHILD = '''
+import json, os, resource, sys, time
+from click.testing import CliRunner
+from src import main
+from src import simulator
+main.client = simulator.SimulatedDevice(bytes.fromhex(sys.argv[1]), float(sys.argv[2]), float(sys.argv[3]), sleep=False)
+start = time.perf_counter()
+result = CliRunner().invoke(main.cli, sys.argv[4:])
+wall = time.perf_counter() - start
+client = main.client.client
+print(json.dumps({'exit_code': result.exit_code, 'output': result.output[-300:], 'wall_ms': wall * 1000,
+    'device_calls': sum(client.calls.values()), 'confirmations': client.confirmations, 'device_ms': client.device_time * 1000,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+def synthetic_entries(size, rng):
+    '''Rows of the entries, titles repeat across accounts, most entries have one tag'''
+    domains = [rng.choice(WORDS) + str(i) + '.' + rng.choice(TLDS) for i in range(max(1, size // 3))]
+    for i in range(size):
+        domain = rng.choice(domains)
+        title = rng.choice(['https://www.' + domain + '/login', domain, domain.split('.')[0].capitalize()])
+        username = rng.choice(['user' + str(i) + '@mail.com', 'user' + str(i % 500), 'first.last' + str(i % 50) + '@' + domain])
+        tag_count = rng.choices([0, 1, 2, 3], [3, 4, 2, 1])[0]
+        tags = sorted(set(rng.choices(range(1, len(TAGS) + 1), [1 / r for r in range(1, len(TAGS) + 1)], k=tag_count)))
+        alphabet = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!$%&'
+        password = ''.join(rng.choice(alphabet) for j in range(rng.randint(8, 40)))
+        safe_note = ''
+        if rng.random() < 0.2:
+            safe_note = 'recovery codes ' + ' '.join(str(rng.randint(100000, 999999)) for j in range(rng.randint(2, 40)))
+        note = rng.choice(['', '', '', 'shared account', 'old password in mail', '2fa on phone'])
+        yield {'title': title, 'username': username, 'tags': tags, 'note': note, 'password': password, 'safe_note': safe_note}
+
+def build_store(size, home, seed):
+    '''Password store, config and an import file in home, like tpass init and insert write them'''
+    rng = random.Random(size)
+    device = simulator.SimulatedDevice(seed)
+    file_name, file_key, enc_key = device.getTrezorKeys()
+    store_path = os.path.join(home, '.tpassword-store')
+    os.makedirs(store_path)
+    os.makedirs(os.path.join(home, '.tpass'))
+    tags = {'0': {'title': 'All', 'icon': 'home'}}
+    for i, title in enumerate(TAGS, 1):
+        tags[str(i)] = {'title': title, 'icon': ICONS[i - 1]}
+    rows = list(synthetic_entries(size, rng))
+    chunks = device.getEntropyChunks([32, 12, 12] * size)
+    nonces = device.getEncryptedNonces(rows, chunks[0::3])
+    entries = {}
+    for i, row in enumerate(rows):
+        plain_nonce = crypto.getPlainNonce(chunks[3 * i])
+        entries[str(i)] = {
+            'title': row['title'], 'username': row['username'], 'nonce': nonces[i], 'tags': row['tags'], 'note': row['note'],
+            'password': {'type': 'Buffer', 'data': crypto.encryptEntryValue(plain_nonce, json.dumps(row['password']), chunks[3 * i + 1])},
+            'safe_note': {'type': 'Buffer', 'data': crypto.encryptEntryValue(plain_nonce, json.dumps(row['safe_note']), chunks[3 * i + 2])},
+            'success': True, 'export': False}
+    db_json = {'version': '0.0.1', 'extVersion': '0.6.0', 'config': {'orderType': 'date'}, 'tags': tags, 'entries': entries}
+    crypto.encryptStorage(db_json, os.path.join(store_path, file_name), enc_key, os.urandom(12))
+    config = {'fileName': file_name, 'path': store_path, 'useGit': False, 'clipboardClearTimeSec': 15, 'storeMetaDataOnDisk': True, 'orderType': 'date', 'showIcons': False}
+    with open(os.path.join(home, '.tpass', 'config.json'), 'w') as f:
+        json.dump(config, f, indent=4)
+    with open(os.path.join(home, 'import.jsonl'), 'w') as f:
+        for row in synthetic_entries(max(10, size // 10), rng):
+            f.write(json.dumps({'item/url*': row['title'], 'title': row['title'], 'username': row['username'], 'password': row['password'],
+                'secret': row['safe_note'], 'tags': ' '.join(TAGS[t - 1] for t in row['tags'])}) + '\n')
+    return file_name
+
+def remove_metadata(file_name):
+    '''Metadata cache, completion and search index of the benchmark store'''
+    for directory in ['/dev/shm', tempfile.gettempdir()]:
+        for path in glob.glob(os.path.join(directory, file_name + '.*')):
+            os.remove(path)
+
+def run_child(home, seed, args, latency, confirm_delay):
+    env = dict(os.environ, HOME=home, PYTHONPATH=ROOT, PYTHONWARNINGS='ignore')
+    args = [a.replace('{home}', home) for a in args]
+    result = subprocess.run([sys.executable, '-c', CHILD, seed.hex(), str(latency), str(confirm_delay)] + args,
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError('benchmark child failed: ' + result.stderr[-2000:])
+    run = json.loads(result.stdout.splitlines()[-1])
+    if run['exit_code'] != 0:
+        raise RuntimeError('tpass ' + ' '.join(args) + ' exited with ' + str(run['exit_code']) + ': ' + run['output'])
+    return run
+
+def run_command(template, seed, file_name, command, latency, confirm_delay):
+    '''One run on a fresh copy of the store, warm commands find the metadata cache'''
+    with tempfile.TemporaryDirectory() as directory:
+        home = os.path.join(directory, 'home')
+        shutil.copytree(template, home)
+        # the store was copied, so is its path
+        config_file = os.path.join(home, '.tpass', 'config.json')
+        with open(config_file) as f:
+            config = json.load(f)
+        config['path'] = os.path.join(home, '.tpassword-store')
+        with open(config_file, 'w') as f:
+            json.dump(config, f, indent=4)
+        remove_metadata(file_name)
+        try:
+            if command['warm']:
+                run_child(home, seed, ['unlock'], latency, confirm_delay)
+            return run_child(home, seed, command['args'], latency, confirm_delay)
+        finally:
+            remove_metadata(file_name)
+
+def compare(results, baseline, tolerance, slack_ms):
+    '''Regressions of results against the baseline, device calls must not grow at all'''
+    regressions = []
+    for size, commands in results.items():
+        for name, r in commands.items():
+            b = baseline.get(str(size), {}).get(name)
+            if b is None:
+                continue
+            if r['wall_ms'] > b['wall_ms'] * (1 + tolerance) + slack_ms:
+                regressions.append('%s %s: wall %.1f ms, baseline %.1f ms' % (size, name, r['wall_ms'], b['wall_ms']))
+            if r['device_calls'] > b['device_calls']:
+                regressions.append('%s %s: %d device calls, baseline %d' % (size, name, r['device_calls'], b['device_calls']))
+            if r['peak_rss_mb'] > b['peak_rss_mb'] * (1 + tolerance):
+                regressions.append('%s %s: peak rss %.1f MB, baseline %.1f MB' % (size, name, r['peak_rss_mb'], b['peak_rss_mb']))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='100,1000,10000', help='comma separated store sizes in entries, up to 100000')
+    parser.add_argument('--commands', default=','.join(COMMANDS), help='comma separated commands to run')
+    parser.add_argument('--runs', type=int, default=3, help='runs per command, the median is reported')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated seconds per device round trip, added to device ms')
+    parser.add_argument('--confirm-delay', type=float, default=0.0, help='simulated seconds per confirmation on the device')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline file to compare with')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results as new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed relative growth of wall time and peak rss')
+    parser.add_argument('--slack-ms', type=float, default=50.0, help='allowed absolute growth of wall time')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    args = parser.parse_args()
+    results = {}
+    for size in [int(s) for s in args.sizes.split(',')]:
+        # own keys per size, so the metadata caches of the sizes never collide
+        seed = ('tpass benchmark ' + str(size)).encode('utf8')
+        results[size] = {}
+        with tempfile.TemporaryDirectory() as template:
+            template = os.path.join(template, 'home')
+            file_name = build_store(size, template, seed)
+            for name in args.commands.split(','):
+                runs = [run_command(template, seed, file_name, COMMANDS[name], args.latency, args.confirm_delay) for i in range(args.runs)]
+                results[size][name] = {k: statistics.median(r[k] for r in runs) for k in ['wall_ms', 'device_calls', 'confirmations', 'device_ms', 'peak_rss_mb']}
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print('%-8s %-8s %10s %12s %13s %10s %12s' % ('entries', 'command', 'wall ms', 'device calls', 'confirmations', 'device ms', 'peak rss MB'))
+        for size, commands in results.items():
+            for name, r in commands.items():
+                print('%-8d %-8s %10.1f %12d %13d %10.1f %12.1f' % (size, name, r['wall_ms'], r['device_calls'], r['confirmations'], r['device_ms'], r['peak_rss_mb']))
+    if args.update_baseline:
+        baseline = {}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        for size, commands in results.items():
+            baseline.setdefault(str(size), {}).update(commands)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=4, sort_keys=True)
+            f.write('\n')
+        return
+    if not os.path.isfile(args.baseline):
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance, args.slack_ms)
+    for regression in regressions:
+        sys.stderr.write('regression: ' + regression + '\n')
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
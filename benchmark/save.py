@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+'''
+Save benchmark, writes synthetic stores of different sizes the way
+save_storage does and reports the latency of every step
+
+    python benchmark/save.py [--sizes 1000,10000,50000] [--runs N] [--json]
+'''
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src import cache
+from src import completion
+from src import crypto
+from src import index
+from src import journal
+
+def synthetic_store(size):
+    '''Locked entries shaped like Trezor Password Manager writes them'''
+    tags = {'0': {'title': 'All', 'icon': 'home'}}
+    for i in range(1, 11):
+        tags[str(i)] = {'title': 'tag' + str(i), 'icon': 'star'}
+    entries = {}
+    for i in range(size):
+        entries[str(i)] = {
+            'title': 'site' + str(i) + '.com', 'username': 'user' + str(i % 97) + '@mail.com',
+            'nonce': os.urandom(64).hex(), 'tags': [i % 10 + 1], 'note': 'note ' + str(i),
+            'password': {'type': 'Buffer', 'data': list(os.urandom(48))},
+            'safe_note': {'type': 'Buffer', 'data': list(os.urandom(40))},
+            'success': True, 'export': False}
+    return {'version': '0.0.1', 'extVersion': '0.6.0', 'config': {'orderType': 'date'}, 'tags': tags, 'entries': entries}
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+def run_save(db_json, directory):
+    enc_key = os.urandom(32).hex()
+    pwd_file = os.path.join(directory, 'store.pswd')
+    cache_file = os.path.join(directory, 'store.pswd.cache')
+    key_file = os.path.join(directory, 'session.key')
+    journal_file = journal.journal_file(pwd_file)
+    store_index = index.StoreIndex(db_json['entries'], db_json['tags'])
+    result = {}
+    result['store_ms'], pwd_data = timed(crypto.encryptStorage, db_json, pwd_file, enc_key, os.urandom(12))
+    result['cache_ms'], _ = timed(cache.write, cache_file, key_file, pwd_file, {'db_json': db_json}, pwd_data, journal_file)
+    result['completion_ms'], _ = timed(completion.write, completion.index_file(cache_file), store_index)
+    # one changed entry appended to the journal instead of writing the store
+    change = {'entries': {'0': db_json['entries']['0']}, 'tags': {}}
+    def append_journal():
+        if not os.path.isfile(journal_file):
+            journal.create(journal_file, cache.file_digest(pwd_file))
+        journal.append(journal_file, crypto.encryptSessionData(json.dumps(change).encode('utf8'), bytes.fromhex(enc_key)))
+    result['journal_ms'], _ = timed(append_journal)
+    result['total_ms'] = result['store_ms'] + result['cache_ms'] + result['completion_ms']
+    result['store_bytes'] = len(pwd_data)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,50000', help='comma separated store sizes in entries')
+    parser.add_argument('--runs', type=int, default=3, help='runs per size, the median is reported')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    args = parser.parse_args()
+    results = {}
+    for size in [int(s) for s in args.sizes.split(',')]:
+        db_json = synthetic_store(size)
+        runs = []
+        for i in range(args.runs):
+            with tempfile.TemporaryDirectory() as directory:
+                runs.append(run_save(db_json, directory))
+        results[size] = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+    print('%-8s %10s %10s %10s %13s %10s %10s' % ('entries', 'MB', 'store ms', 'cache ms', 'completion ms', 'total ms', 'journal ms'))
+    for size, r in results.items():
+        print('%-8d %10.1f %10.1f %10.1f %13.1f %10.1f %10.1f' % (size, r['store_bytes'] / 1e6, r['store_ms'], r['cache_ms'], r['completion_ms'], r['total_ms'], r['journal_ms']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+'''
+Startup benchmark, runs tpass commands in fresh interpreters with
+python -X importtime and reports import cost per command
+
+    python benchmark/startup.py [--runs N] [--json]
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['trezorlib', 'cryptography', 'pyperclip', 'simplejson']
+COMMANDS = {
+    'version': {'args': ['--version']},
+    'config': {'args': ['config']},
+    'lock': {'args': ['lock']},
+    'git': {'args': ['git', 'status']},
+    'complete-entries': {'args': [], 'env': {'_TPASS_COMPLETE': 'complete', 'COMP_WORDS': 'tpass show ', 'COMP_CWORD': '2'}},
+    'complete-tags': {'args': [], 'env': {'_TPASS_COMPLETE': 'complete', 'COMP_WORDS': 'tpass list ', 'COMP_CWORD': '2'}},
+}
+# lazy modules are only executed on first use, which importtime does not see
+SCRIPT = '''
+import atexit, sys
+HEAVY = %r
+@atexit.register
+def report():
+    loaded = [h for h in HEAVY if h in sys.modules and type(sys.modules[h]).__name__ != '_LazyModule']
+    sys.stderr.write('heavy modules: ' + ','.join(loaded) + '\\n')
+from src.main import cli
+sys.argv = ['tpass'] + sys.argv[1:]
+cli(prog_name='tpass')
+''' % HEAVY_MODULES
+
+def parse_importtime(stderr):
+    '''Cumulative import time of every top level module in microseconds'''
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = len(name) - len(name.lstrip(' '))
+        modules[name.strip()] = {'self': int(self_us), 'cumulative': int(cumulative_us), 'depth': depth}
+    return modules
+
+def run_command(name, command, home):
+    env = dict(os.environ, HOME=home, PYTHONPATH=ROOT, PYTHONWARNINGS='ignore')
+    env.update(command.get('env', {}))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', SCRIPT] + command['args'],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    wall = time.perf_counter() - start
+    modules = parse_importtime(result.stderr)
+    top_level = min((m['depth'] for m in modules.values()), default=0)
+    total = sum(m['cumulative'] for m in modules.values() if m['depth'] == top_level)
+    heavy = []
+    for line in result.stderr.splitlines():
+        if line.startswith('heavy modules: '):
+            heavy = [h for h in line[len('heavy modules: '):].split(',') if h]
+    return {'wall_ms': wall * 1000, 'import_ms': total / 1000, 'heavy': heavy}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='runs per command, the median is reported')
+    parser.add_argument('--json', action='store_true', help='print results as json')
+    args = parser.parse_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+        os.mkdir(os.path.join(home, '.tpass'))
+        # warm up the bytecode cache
+        run_command('version', COMMANDS['version'], home)
+        for name, command in COMMANDS.items():
+            runs = [run_command(name, command, home) for i in range(args.runs)]
+            results[name] = {
+                'wall_ms': statistics.median(r['wall_ms'] for r in runs),
+                'import_ms': statistics.median(r['import_ms'] for r in runs),
+                'heavy': runs[-1]['heavy'],
+            }
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+    print('%-18s %10s %10s  %s' % ('command', 'wall ms', 'import ms', 'heavy modules loaded'))
+    for name, r in results.items():
+        print('%-18s %10.1f %10.1f  %s' % (name, r['wall_ms'], r['import_ms'], ', '.join(r['heavy']) or '-'))
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,30 @@
 # __init__.py
-from . import crypto
-from . import trezor
-from . import main
\ No newline at end of file
+import importlib
+import importlib.util
+import sys
+
+# submodules are imported on first use, trezorlib and cryptography are slow to load
+SUBMODULES = ['agent', 'atomic', 'cache', 'completion', 'crypto', 'daemon', 'index', 'journal', 'main', 'pattern', 'simulator', 'timing', 'transfer', 'trezor', 'wordlist']
+
+def __getattr__(name):
+    if name in SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module ' + __name__ + ' has no attribute ' + name)
+
+def lazy_import(*names):
+    '''
+    Module object for the first installed of names, the module code only runs
+    on first attribute access
+    '''
+    for name in names:
+        if name in sys.modules:
+            return sys.modules[name]
+        spec = importlib.util.find_spec(name)
+        if spec is not None:
+            loader = importlib.util.LazyLoader(spec.loader)
+            spec.loader = loader
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[name] = module
+            loader.exec_module(module)
+            return module
+    raise ImportError('none of ' + ', '.join(names) + ' is installed')
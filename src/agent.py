@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import abc
+import inspect
+import os
+import socket
+import time
+from src import lazy_import
+
+json = lazy_import('simplejson', 'json')
+
+# a client that stops reading or writing does not block the others for longer
+CONNECTION_TIMEOUT = 10
+
+'''
+Local agent holding the trezor keys of a session in memory, clients talk to
+it with one json line per request over a unix socket
+'''
+
+class AgentServer(abc.ABC):
+    '''
+    Serves json requests on a unix socket only the user can access,
+    subclasses answer them in handle_request
+    '''
+    def __init__(self, sock_path):
+        self.sock_path = sock_path
+        self.running = False
+
+    def serve(self):
+        if os.path.exists(self.sock_path):
+            os.remove(self.sock_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(self.sock_path)
+        finally:
+            os.umask(old_umask)
+        server.listen(5)
+        server.settimeout(1)
+        self.running = True
+        try:
+            while self.running:
+                self.tick()
+                try:
+                    conn, address = server.accept()
+                except socket.timeout:
+                    continue
+                with conn:
+                    self.__handle(conn)
+        finally:
+            server.close()
+            if os.path.exists(self.sock_path):
+                os.remove(self.sock_path)
+
+    def __handle(self, conn):
+        conn.settimeout(CONNECTION_TIMEOUT)
+        with conn.makefile('rwb') as f:
+            try:
+                request = json.loads(f.readline().decode('utf8'))
+                response = self.handle_request(request)
+                if inspect.isgenerator(response):
+                    # streamed responses, one line per item and a last one to end them
+                    for item in response:
+                        f.write((json.dumps(item) + '\n').encode('utf8'))
+                        f.flush()
+                    response = {'end': True}
+            except socket.timeout:
+                return
+            except Exception as ex:
+                response = {'error': str(ex)}
+            try:
+                f.write((json.dumps(response) + '\n').encode('utf8'))
+            except OSError:
+                pass
+
+    def tick(self):
+        pass
+
+    @abc.abstractmethod
+    def handle_request(self, request):
+        '''Response dict for a request dict, exceptions are sent back as error'''
+
+class KeyAgent(AgentServer):
+    '''Keeps keys for ttl seconds after they were stored, 0 keeps them until stopped'''
+    def __init__(self, sock_path, ttl):
+        super().__init__(sock_path)
+        self.ttl = ttl
+        self.keys = None
+        self.expires = 0
+
+    def tick(self):
+        if self.keys is not None and self.ttl > 0 and time.time() > self.expires:
+            self.keys = None
+
+    def handle_request(self, request):
+        cmd = request.get('cmd')
+        if cmd == 'get':
+            self.tick()
+            return {'keys': self.keys}
+        if cmd == 'put':
+            self.keys = request['keys']
+            self.expires = time.time() + self.ttl
+            return {'ok': True}
+        if cmd == 'forget':
+            self.keys = None
+            return {'ok': True}
+        if cmd == 'stop':
+            self.keys = None
+            self.running = False
+            return {'ok': True}
+        raise ValueError('unknown agent command: ' + str(cmd))
+
+def send_request(sock_path, request):
+    '''Returns the agent response or None when no agent is reachable'''
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(sock_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(sock_path)
+            with s.makefile('rwb') as f:
+                f.write((json.dumps(request) + '\n').encode('utf8'))
+                f.flush()
+                response = json.loads(f.readline().decode('utf8'))
+    except (OSError, ValueError):
+        return None
+    if 'error' in response:
+        raise RuntimeError(response['error'])
+    return response
+
+def stream_request(sock_path, request):
+    '''Yields the responses of a streamed request until the server ends it'''
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(sock_path):
+        raise RuntimeError('not reachable: ' + sock_path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(sock_path)
+        with s.makefile('rwb') as f:
+            f.write((json.dumps(request) + '\n').encode('utf8'))
+            f.flush()
+            for line in f:
+                response = json.loads(line.decode('utf8'))
+                if 'error' in response:
+                    raise RuntimeError(response['error'])
+                if 'end' in response:
+                    return
+                yield response
+    raise RuntimeError('stream ended early: ' + sock_path)
+
+def is_running(sock_path):
+    return send_request(sock_path, {'cmd': 'get'}) is not None
+
+def get_keys(sock_path):
+    response = send_request(sock_path, {'cmd': 'get'})
+    if response is None:
+        return None
+    return response['keys']
+
+def put_keys(sock_path, keys):
+    return send_request(sock_path, {'cmd': 'put', 'keys': keys}) is not None
+
+def forget_keys(sock_path):
+    return send_request(sock_path, {'cmd': 'forget'}) is not None
+
+def stop(sock_path):
+    return send_request(sock_path, {'cmd': 'stop'}) is not None
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import contextlib
+import os
+import tempfile
+
+'''
+Crash safe file replacement. Data goes to a temporary file in the same
+directory, is flushed to disk and renamed over the target, so readers and
+sync clients only ever see the old or the new file, never a partial one.
+'''
+
+def write_file(path, data, mode=None):
+    '''
+    mode of a new file, None keeps the mode of the file being replaced or
+    uses the default for new files
+    '''
+    with open_file(path, mode) as f:
+        f.write(data)
+
+@contextlib.contextmanager
+def open_file(path, mode=None):
+    '''
+    Binary file to stream into, it replaces path when the block ends and is
+    removed if the block raises, also on exit
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    if mode is None:
+        mode = default_mode(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    sync_directory(directory)
+
+def default_mode(path):
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def sync_directory(directory):
+    '''Persists the rename, not possible on every platform'''
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import pickle
+from src import atomic
+from src import crypto
+from src import journal
+
+'''
+Metadata cache in the tmp directory, encrypted with a random session key.
+A cache is valid as long as the password file it was made from is unchanged,
+checked by mtime and size first and by content hash if those differ, and as
+long as the journal next to it did not change.
+'''
+
+CACHE_VERSION = 3
+SESSION_KEY_BYTES = 32
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(crypto.READ_CHUNK_BYTES)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+def load(cache_file, key_file, pwd_file, journal_file=None):
+    '''Returns the cached payload or None when missing, stale or unreadable'''
+    if not os.path.isfile(cache_file) or not os.path.isfile(key_file):
+        return None
+    try:
+        with open(key_file, 'rb') as f:
+            key = f.read()
+        with open(cache_file, 'rb') as f:
+            payload = pickle.loads(crypto.decryptSessionData(f.read(), key))
+    except Exception:
+        return None
+    if payload.get('version') != CACHE_VERSION:
+        return None
+    if journal_file is not None and payload.get('journal') != journal.stat(journal_file):
+        return None
+    st = os.stat(pwd_file)
+    if st.st_mtime == payload['mtime'] and st.st_size == payload['size']:
+        return payload
+    if st.st_size == payload['size'] and file_digest(pwd_file) == payload['digest']:
+        # touched by a sync client, content is the same, the new mtime saves
+        # hashing the password file again next time
+        payload['mtime'] = st.st_mtime
+        try:
+            write_private(cache_file, crypto.encryptSessionData(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL), key))
+        except OSError:
+            pass
+        return payload
+    return None
+
+def write(cache_file, key_file, pwd_file, payload, pwd_data=None, journal_file=None, digest=None):
+    '''
+    pwd_data is the just written password file content and digest its known
+    hash, both save reading the password file again
+    '''
+    if digest is None and pwd_data is not None:
+        digest = hashlib.sha256(pwd_data).hexdigest()
+    elif digest is None:
+        digest = file_digest(pwd_file)
+    st = os.stat(pwd_file)
+    payload = dict(payload, version=CACHE_VERSION, mtime=st.st_mtime, size=st.st_size, digest=digest)
+    if journal_file is not None:
+        payload['journal'] = journal.stat(journal_file)
+    data = crypto.encryptSessionData(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL), session_key(key_file))
+    write_private(cache_file, data)
+
+def remove(cache_file, key_file):
+    removed = False
+    for path in [cache_file, key_file]:
+        if os.path.isfile(path):
+            os.remove(path)
+            removed = True
+    return removed
+
+def session_key(key_file):
+    if os.path.isfile(key_file):
+        with open(key_file, 'rb') as f:
+            key = f.read()
+        if len(key) == SESSION_KEY_BYTES:
+            return key
+    key = os.urandom(SESSION_KEY_BYTES)
+    write_private(key_file, key)
+    return key
+
+def write_private(path, data):
+    atomic.write_file(path, data, 0o600)
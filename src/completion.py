@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import json
+import os
+import tempfile
+from src import atomic
+
+'''
+Completion index next to the metadata cache, written on unlock and save.
+Reading it only needs the standard library, tab completion never imports
+trezorlib or cryptography and never asks the device for keys.
+'''
+
+ENTRY = 'e'
+TAG = 't'
+
+def index_file(tmp_file):
+    return os.path.splitext(tmp_file)[0] + '.completion'
+
+def locate(config_file, tmp_path):
+    '''Path of the completion index, None if metadata is not stored on disk'''
+    try:
+        with open(config_file) as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if config.get('storeMetaDataOnDisk') is not True or not config.get('fileName'):
+        return None
+    if not os.path.exists(tmp_path):
+        tmp_path = tempfile.gettempdir()
+    return index_file(os.path.join(tmp_path, config['fileName'] + '.cache'))
+
+def write(path, store_index):
+    lines = [TAG + '\t' + k for k in store_index.complete_tags('')]
+    lines.extend(ENTRY + '\t' + k for k in store_index.complete_entries(''))
+    data = ''.join(line + '\n' for line in lines if '\n' not in line)
+    atomic.write_file(path, data.encode('utf8'), 0o600)
+
+def complete(path, kind, incomplete):
+    '''Case insensitive substring matches, nothing if there is no index yet'''
+    if path is None or not os.path.isfile(path):
+        return []
+    prefix = kind + '\t'
+    incomplete = incomplete.lower()
+    matches = []
+    with open(path, encoding='utf8') as f:
+        for line in f:
+            if line.startswith(prefix) and incomplete in line[2:].lower():
+                matches.append(line[2:].rstrip('\n'))
+    return matches
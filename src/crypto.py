@@ -1,45 +1,62 @@
 #!/usr/bin/env python3
+import base64
+import hashlib
 import os
-import random
 import secrets
 import string
-try:
-    import simplejson as json
-except:
-    import json
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
-from random import randint
+from src import atomic
+from src import lazy_import
+
+json = lazy_import('simplejson', 'json')
+
+READ_CHUNK_BYTES = 64 * 1024
+# shortest password with lower and upper case letters and two digits
+MIN_PASSWORD_LENGTH = 4
+# entropy fetched at once, the reader asks for more when a block is used up
+MAX_ENTROPY_BLOCK = 16 * 1024
+# Buffer is the TPM compatible list of byte values, base64 is opt-in and smaller
+ENTRY_ENCODINGS = ['Buffer', 'base64']
+
+def getCipher(key, iv, tag=None):
+    # cryptography is only imported when something gets en- or decrypted
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.backends import default_backend
+    return Cipher(algorithms.AES(key), modes.GCM(iv, tag), backend=default_backend())
 
 # @author:satoshilabs
 def decryptEntryValue(nonce, valArr):
-    valHex = ''.join([hex(x)[2:].zfill(2) for x in valArr])
-    val = bytes.fromhex(valHex)
+    val = decodeEntryValue(valArr)
     cipherkey = bytes.fromhex(nonce)
     iv = val[:12]
     tag = val[12:28]
-    cipher = Cipher(algorithms.AES(cipherkey), modes.GCM(iv, tag), backend=default_backend())
+    cipher = getCipher(cipherkey, iv, tag)
     decryptor = cipher.decryptor()
-    data = ''
-    inputData = val[28:]
-    while True:
-        block = inputData[:16]
-        inputData = inputData[16:]
-        if block:
-            data = data + decryptor.update(block).decode()
-        else:
-            break
-        # throws exception when the tag is wrong
-    data = data + decryptor.finalize().decode()
-    return json.loads(data)
+    data = decryptor.update(memoryview(val)[28:])
+    # throws exception when the tag is wrong
+    data = data + decryptor.finalize()
+    return json.loads(data.decode())
+
+def getPlainNonce(entropy):
+    # same digest TrezorDevice.getEncryptedNonce hands to the device
+    return hashlib.sha256(entropy).hexdigest()
 
-def encryptEntryValue(nonce, val, iv):
+def encryptEntryValue(nonce, val, iv, encoding='Buffer'):
     cipherkey = bytes.fromhex(nonce)
-    cipher = Cipher(algorithms.AES(cipherkey), modes.GCM(iv), backend=default_backend())
+    cipher = getCipher(cipherkey, iv)
     encryptor = cipher.encryptor()
     cipherText = encryptor.update(val.encode("utf-8", "replace")) + encryptor.finalize()
     cipherText = iv + encryptor.tag + cipherText
-    return [x for x in cipherText]
+    return encodeEntryValue(cipherText, encoding)
+
+def encodeEntryValue(cipherText, encoding='Buffer'):
+    if encoding == 'base64':
+        return base64.b64encode(cipherText).decode('ascii')
+    return list(cipherText)
+
+def decodeEntryValue(valArr):
+    if isinstance(valArr, str):
+        return base64.b64decode(valArr)
+    return bytes(valArr)
 
 # @author:satoshilabs
 def decryptStorage(store_path, encKey):
@@ -47,46 +64,136 @@ def decryptStorage(store_path, encKey):
     with open(store_path, 'rb') as f:
         iv = f.read(12)
         tag = f.read(16)
-        cipher = Cipher(algorithms.AES(cipherkey), modes.GCM(iv, tag), backend=default_backend())
+        cipher = getCipher(cipherkey, iv, tag)
         decryptor = cipher.decryptor()
-        data = ''
+        # update_into needs one block of headroom behind the output
+        size = max(os.fstat(f.fileno()).st_size - 28, 0)
+        data = memoryview(bytearray(size + 15))
+        chunk = memoryview(bytearray(READ_CHUNK_BYTES))
+        offset = 0
         while True:
-            block = f.read(16)
-            if block:
-                data = data + decryptor.update(block).decode()
-            else:
+            n = f.readinto(chunk)
+            if not n:
                 break
-        data = data + decryptor.finalize().decode()
-    return json.loads(data)
+            offset = offset + decryptor.update_into(chunk[:n], data[offset:])
+        # throws exception when the tag is wrong, decode only authenticated data
+        decryptor.finalize()
+    return json.loads(str(data[:offset], 'utf8'))
 
-def encryptStorage(db_json, store_path, encKey, iv): #TODO put file writing in main
+def encryptStorage(db_json, store_path, encKey, iv):
+    '''Writes iv, tag and ciphertext from one buffer and atomically replaces the store'''
     cipherkey = bytes.fromhex(encKey)
-    cipher = Cipher(algorithms.AES(cipherkey), modes.GCM(iv), backend=default_backend())
+    cipher = getCipher(cipherkey, iv)
     encryptor = cipher.encryptor()
-    cipherText = encryptor.update(json.dumps(db_json).encode("UTF-8", "replace")) + encryptor.finalize()
-    cipherText = iv + encryptor.tag + cipherText
-    with open(store_path, 'wb') as f:
-        f.write(cipherText)
-            
-def generatePassword(length):
-    chars = (string.digits + string.ascii_letters + string.punctuation)
+    plainText = json.dumps(db_json).encode("UTF-8", "replace")
+    # update_into needs one block of headroom behind the output
+    data = memoryview(bytearray(28 + len(plainText) + 15))
+    data[:12] = iv
+    n = encryptor.update_into(plainText, data[28:])
+    encryptor.finalize()
+    data[12:28] = encryptor.tag
+    data = data[:28 + n]
+    atomic.write_file(store_path, data)
+    return data
+
+def encryptSessionData(data, key):
+    iv = os.urandom(12)
+    cipher = getCipher(key, iv)
+    encryptor = cipher.encryptor()
+    cipherText = encryptor.update(data) + encryptor.finalize()
+    return iv + encryptor.tag + cipherText
+
+def decryptSessionData(data, key):
+    data = memoryview(data)
+    cipher = getCipher(key, bytes(data[:12]), bytes(data[12:28]))
+    decryptor = cipher.decryptor()
+    # throws exception when the tag is wrong
+    return decryptor.update(data[28:]) + decryptor.finalize()
+
+PASSWORD_CHARS = string.digits + string.ascii_letters + string.punctuation
+
+class EntropyReader:
+    '''
+    Uniform random indices from blocks of entropy, source(n) returns n bytes
+    and is only asked again when a block is used up
+    '''
+    def __init__(self, source=secrets.token_bytes, block=None):
+        self.source = source
+        self.data = source(block) if block else b''
+        self.pos = 0
+
+    def read(self, n):
+        if self.pos + n > len(self.data):
+            self.data = self.data[self.pos:] + self.source(max(n, len(self.data)) - (len(self.data) - self.pos))
+            self.pos = 0
+        data = self.data[self.pos:self.pos + n]
+        self.pos = self.pos + n
+        return data
+
+    def indices(self, n, count):
+        '''count indices below n, values past the last multiple of n are rejected, so none is more likely'''
+        width = indexBytes(n)
+        limit = 256 ** width - (256 ** width) % n
+        found = []
+        while len(found) < count:
+            missing = count - len(found)
+            # expected bytes for the missing indices, with some spare
+            chunk = self.read(width * (missing + missing * (256 ** width - limit) // limit + 1))
+            if width == 1:
+                values = chunk
+            else:
+                values = [int.from_bytes(chunk[i:i + width], 'big') for i in range(0, len(chunk), width)]
+            for i, v in enumerate(values):
+                if v < limit:
+                    found.append(v % n)
+                    if len(found) == count:
+                        # unused bytes stay for the next call
+                        self.pos = self.pos - width * (len(values) - i - 1)
+                        break
+        return found
+
+def indexBytes(n):
+    return max(1, ((n - 1).bit_length() + 7) // 8)
+
+def entropyBytes(type_, length, count, alphabet_size):
+    '''Bytes expected for count secrets, with some spare for rejected values, at most one block'''
+    width = indexBytes(alphabet_size)
+    limit = 256 ** width - (256 ** width) % alphabet_size
+    expected = width * length * count * 256 ** width / limit
+    if type_ == 'password':
+        # passwords without the required character classes are drawn again
+        if length < MIN_PASSWORD_LENGTH:
+            raise ValueError('password length must be at least ' + str(MIN_PASSWORD_LENGTH))
+        expected = expected / passwordAcceptance(length)
+    return min(int(expected * 1.1) + 64, MAX_ENTROPY_BLOCK)
+
+def passwordAcceptance(length):
+    '''Share of random passwords with lower and upper case letters and two digits'''
+    digits = len(string.digits) / len(PASSWORD_CHARS)
+    letters = len(string.ascii_lowercase) / len(PASSWORD_CHARS)
+    def two_digits(mass):
+        # all characters from a subset of the given mass, two of them digits
+        p = digits / mass
+        return mass ** length * (1 - (1 - p) ** length - length * p * (1 - p) ** (length - 1))
+    return two_digits(1) - 2 * two_digits(1 - letters) + two_digits(1 - 2 * letters)
+
+def generatePassword(length, reader=None):
+    if length < MIN_PASSWORD_LENGTH:
+        raise ValueError('password length must be at least ' + str(MIN_PASSWORD_LENGTH))
+    reader = reader or EntropyReader()
     while True:
-        password = ''.join(random.choice(chars) for x in range(length))
+        password = ''.join(PASSWORD_CHARS[i] for i in reader.indices(len(PASSWORD_CHARS), length))
         if (any(c.islower() for c in password)
                 and any(c.isupper() for c in password)
                 and sum(c.isdigit() for c in password) >= 2):
             break
     return password
 
-def generatePassphrase(length, words, seperator):
-    winners = []
-    for i in range(0, int(length)):
-        choose = (secrets.randbelow(6) + 1) + 10 * (secrets.randbelow(6) + 1) + 100 * (secrets.randbelow(6) + 1) + 1000 * (secrets.randbelow(6) + 1) + 10000 * (secrets.randbelow(6) + 1)
-        winners.append(words[str(choose)])
-    return seperator.join(winners)
-
-def generatePin(length):
-    pin = ''
-    for i in range(0, int(length)):
-        pin = pin + str(secrets.randbelow(10))
-    return pin
+def generatePassphrase(length, words, seperator, reader=None):
+    '''words is the list of the wordlist, one uniform draw per word'''
+    reader = reader or EntropyReader()
+    return seperator.join(words[i] for i in reader.indices(len(words), int(length)))
+
+def generatePin(length, reader=None):
+    reader = reader or EntropyReader()
+    return ''.join(str(i) for i in reader.indices(10, int(length)))
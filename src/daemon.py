@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+from src import agent
+
+'''
+Long running daemon keeping the connection to the trezor device open, cli
+commands send their device calls to it instead of enumerating devices and
+connecting on every start
+'''
+
+NONCE_FIELDS = ['item', 'title', 'username', 'nonce']
+
+class DeviceDaemon(agent.AgentServer):
+    '''Runs device calls of RemoteDevice clients on one open TrezorDevice'''
+    def __init__(self, sock_path, device):
+        super().__init__(sock_path)
+        self.device = device
+
+    def handle_request(self, request):
+        cmd = request.get('cmd')
+        if cmd == 'ping':
+            return {'ok': True}
+        if cmd == 'stop':
+            self.running = False
+            return {'ok': True}
+        if cmd == 'iterDecryptedNonces':
+            return self.__stream(self.device.iterDecryptedNonces(request['entries']))
+        try:
+            return {'result': self.__call(cmd, request)}
+        except Exception:
+            # reconnect on next request, the device might have been unplugged
+            self.device.disconnect()
+            raise
+
+    def __stream(self, results):
+        try:
+            for result in results:
+                yield {'result': result}
+        except Exception:
+            self.device.disconnect()
+            raise
+
+    def __call(self, cmd, request):
+        if cmd == 'getTrezorKeys':
+            return self.device.getTrezorKeys()
+        if cmd == 'getEntropyChunks':
+            return [e.hex() for e in self.device.getEntropyChunks(request['lengths'])]
+        if cmd == 'getEncryptedNonce':
+            return self.device.getEncryptedNonce(request['entry'], bytes.fromhex(request['entropy']))
+        if cmd == 'getEncryptedNonces':
+            return self.device.getEncryptedNonces(request['entries'], [bytes.fromhex(e) for e in request['entropies']])
+        if cmd == 'getDecryptedNonces':
+            return self.device.getDecryptedNonces(request['entries'])
+        raise ValueError('unknown daemon command: ' + str(cmd))
+
+class RemoteDevice:
+    '''Same interface as TrezorDevice, forwards every call to the daemon'''
+    def __init__(self, sock_path):
+        self.sock_path = sock_path
+
+    def __call(self, request):
+        response = agent.send_request(self.sock_path, request)
+        if response is None:
+            raise RuntimeError('daemon not reachable: ' + self.sock_path)
+        return response['result']
+
+    def getTrezorKeys(self):
+        return self.__call({'cmd': 'getTrezorKeys'})
+
+    def getEntropy(self, length):
+        return self.getEntropyChunks([length])[0]
+
+    def getEntropyChunks(self, lengths):
+        return [bytes.fromhex(e) for e in self.__call({'cmd': 'getEntropyChunks', 'lengths': lengths})]
+
+    def getEncryptedNonce(self, entry, entropy):
+        return self.__call({'cmd': 'getEncryptedNonce', 'entry': nonce_fields(entry), 'entropy': entropy.hex()})
+
+    def getEncryptedNonces(self, entries, entropies):
+        return self.__call({'cmd': 'getEncryptedNonces', 'entries': [nonce_fields(e) for e in entries], 'entropies': [e.hex() for e in entropies]})
+
+    def getDecryptedNonce(self, entry):
+        return self.getDecryptedNonces([entry])[0]
+
+    def iterDecryptedNonces(self, entries):
+        '''One request for all entries, nonces arrive as the device answers'''
+        request = {'cmd': 'iterDecryptedNonces', 'entries': [nonce_fields(e) for e in entries]}
+        for response in agent.stream_request(self.sock_path, request):
+            yield response['result']
+
+    def getDecryptedNonces(self, entries):
+        return self.__call({'cmd': 'getDecryptedNonces', 'entries': [nonce_fields(e) for e in entries]})
+
+def nonce_fields(entry):
+    return {k: v for k, v in entry.items() if k in NONCE_FIELDS}
+
+def is_running(sock_path):
+    return agent.send_request(sock_path, {'cmd': 'ping'}) is not None
+
+def stop(sock_path):
+    return agent.send_request(sock_path, {'cmd': 'stop'}) is not None
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+import bisect
+import collections
+import re
+
+'''
+In-memory lookup tables for entries and tags, built once per unlock and kept
+up to date on insert, edit and remove
+'''
+
+ALL_TAG = '0'
+ORDER_TYPES = ['date', 'title']
+# fields of the full text search, the weight doubles per field
+SEARCH_FIELDS = ['note', 'username', 'title']
+EXACT = 3; PREFIX = 2; SUBSTRING = 1
+FUZZY_SIMILARITY = 0.5
+TOKEN_RE = re.compile(r'\w+')
+
+# weight of the best field in a field mask, the highest set bit
+MASK_WEIGHTS = [1 << mask.bit_length() - 1 if mask else 0 for mask in range(1 << len(SEARCH_FIELDS))]
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+def trigrams(token):
+    padded = '\x02' + token + '\x03'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class PrefixIndex:
+    '''
+    Sorted keys answering prefix queries with two binary searches and
+    substring queries with one scan
+    '''
+    def __init__(self, keys=()):
+        self.keys = sorted(set(keys))
+
+    def add(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            self.keys.insert(i, key)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def find(self, prefix):
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\U0010ffff')
+        return self.keys[start:end]
+
+    def search(self, substring, separator='\0'):
+        '''Keys containing substring in front of the separator'''
+        if substring == '':
+            return list(self.keys)
+        return [k for k in self.keys if substring in k.split(separator, 1)[0]]
+
+class SortOrder:
+    '''Ids sorted by a sort key, kept sorted with binary search on add and remove'''
+    def __init__(self, keyed_ids=()):
+        self.keys = sorted(keyed_ids)   # [(sort key, id)]
+
+    def add(self, sort_key, item_id):
+        bisect.insort(self.keys, (sort_key, item_id))
+
+    def remove(self, sort_key, item_id):
+        i = bisect.bisect_left(self.keys, (sort_key, item_id))
+        if i < len(self.keys) and self.keys[i] == (sort_key, item_id):
+            del self.keys[i]
+
+    def ids(self):
+        return [item_id for sort_key, item_id in self.keys]
+
+def id_key(item_id):
+    '''Numeric order for ids without leading zeros, comparable with any string id'''
+    return (len(item_id), item_id)
+
+def sort_key(order, item_id, title):
+    if order == 'title':
+        return (title, id_key(item_id))
+    return id_key(item_id)
+
+class SearchIndex:
+    '''
+    Inverted index from the tokens of title, username and note to entries.
+    A query term matches tokens exactly, by prefix or, from three characters
+    on, as substring found through the trigrams of the tokens. Terms without
+    any match fall back to tokens with similar trigrams. Terms shorter than
+    three characters or with other characters than letters and digits are
+    searched as plain substrings of the fields. All terms of a query have to
+    match, entries are ranked by match quality and field.
+    '''
+    def __init__(self, entries=None):
+        self.postings = {}      # token -> {entry id: field mask}
+        self.grams = {}         # trigram -> {token}
+        self.indexed = {}       # entry id -> {token: field mask}
+        self.texts = {}         # entry id -> lower case fields, for substring terms
+        # collect tokens first and sort them once
+        self.tokens = []
+        for k, v in (entries or {}).items():
+            self.add_entry(k, v)
+        self.tokens = PrefixIndex(self.tokens)
+
+    def add_entry(self, entry_id, entry):
+        tokens = {}
+        for bit, field in enumerate(SEARCH_FIELDS):
+            for token in tokenize(entry.get(field) or ''):
+                tokens[token] = tokens.get(token, 0) | 1 << bit
+        self.indexed[entry_id] = tokens
+        self.texts[entry_id] = [(entry.get(field) or '').lower() for field in SEARCH_FIELDS]
+        for token, mask in tokens.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                for gram in trigrams(token):
+                    self.grams.setdefault(gram, set()).add(token)
+                if isinstance(self.tokens, list):
+                    self.tokens.append(token)
+                else:
+                    self.tokens.add(token)
+            postings[entry_id] = mask
+
+    def remove_entry(self, entry_id):
+        self.texts.pop(entry_id, None)
+        for token in self.indexed.pop(entry_id, {}):
+            postings = self.postings[token]
+            del postings[entry_id]
+            if not postings:
+                del self.postings[token]
+                for gram in trigrams(token):
+                    self.grams[gram].discard(token)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+                self.tokens.remove(token)
+
+    def update_entry(self, entry_id, entry):
+        self.remove_entry(entry_id)
+        self.add_entry(entry_id, entry)
+
+    def search(self, query, fuzzy=True):
+        '''Entry ids matching all terms of query, best match first'''
+        words = set(query.lower().split())
+        if not words:
+            return []
+        scanned = [term for term in words if len(term) < 3 or not TOKEN_RE.fullmatch(term)]
+        terms = [self.__match_term(term, fuzzy) for term in words.difference(scanned)]
+        # score the rarest term over its postings, the others only over the candidates left
+        terms.sort(key=lambda matches: sum(len(self.postings[token]) for token in matches))
+        scores = self.__score(terms[0]) if terms else None
+        for matches in terms[1:]:
+            if not scores:
+                break
+            scores = self.__rescore(scores, matches)
+        # substring terms scan the fields of the candidates, or of all entries
+        for term in scanned:
+            if scores is not None and not scores:
+                break
+            scores = self.__scan(scores, term)
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def __match_term(self, term, fuzzy):
+        '''Tokens matching term with their match quality'''
+        matches = {}
+        if term in self.postings:
+            matches[term] = EXACT
+        for token in self.tokens.find(term):
+            matches.setdefault(token, PREFIX)
+        if len(term) >= 3:
+            for token in self.__substring_tokens(term):
+                matches.setdefault(token, SUBSTRING)
+        if not matches and fuzzy:
+            matches = self.__similar_tokens(term)
+        return matches
+
+    def __score(self, matches):
+        scores = {}
+        for token, quality in matches.items():
+            weights = [quality * w for w in MASK_WEIGHTS]
+            if not scores:
+                scores = {entry_id: weights[mask] for entry_id, mask in self.postings[token].items()}
+                continue
+            for entry_id, mask in self.postings[token].items():
+                if weights[mask] > scores.get(entry_id, 0):
+                    scores[entry_id] = weights[mask]
+        return scores
+
+    def __rescore(self, scores, matches):
+        result = {}
+        for entry_id, score in scores.items():
+            best = 0
+            for token, mask in self.indexed[entry_id].items():
+                quality = matches.get(token)
+                if quality is not None and quality * MASK_WEIGHTS[mask] > best:
+                    best = quality * MASK_WEIGHTS[mask]
+            if best:
+                result[entry_id] = score + best
+        return result
+
+    def __scan(self, scores, term):
+        result = {}
+        for entry_id in (self.texts if scores is None else scores):
+            mask = 0
+            for bit, text in enumerate(self.texts[entry_id]):
+                if term in text:
+                    mask |= 1 << bit
+            if not mask:
+                continue
+            best = SUBSTRING * MASK_WEIGHTS[mask]
+            # short words still rank exact and prefix matches of tokens higher
+            for token, token_mask in self.indexed[entry_id].items():
+                if token.startswith(term):
+                    quality = EXACT if token == term else PREFIX
+                    best = max(best, quality * MASK_WEIGHTS[token_mask])
+            result[entry_id] = best + (scores[entry_id] if scores is not None else 0)
+        return result
+
+    def __substring_tokens(self, term):
+        grams = sorted((self.grams.get(term[i:i + 3], ()) for i in range(len(term) - 2)), key=len)
+        return [token for token in set(grams[0]).intersection(*grams[1:]) if term in token]
+
+    def __similar_tokens(self, term):
+        grams = trigrams(term)
+        common = collections.Counter()
+        for gram in grams:
+            common.update(self.grams.get(gram, ()))
+        matches = {}
+        for token, count in common.items():
+            # dice coefficient, a token of length n has at most n trigrams
+            similarity = 2 * count / (len(grams) + len(token))
+            if similarity >= FUZZY_SIMILARITY:
+                matches[token] = min(similarity, 1) * SUBSTRING
+        return matches
+
+class StoreIndex:
+    def __init__(self, entries, tags):
+        self.entry_titles = {}      # title -> {entry id}
+        self.entry_logins = {}      # (title, username) -> {entry id}
+        self.tag_entries = {}       # tag id -> {entry id}, untagged entries are in ALL_TAG
+        self.tag_titles = {}        # tag title -> {tag id}
+        self.indexed_entries = {}   # entry id -> indexed fields, to unindex after in place edits
+        self.indexed_tags = {}      # tag id -> indexed title
+        # ids are never reused, removing the highest id does not lower them
+        self.next_entry_id = 0
+        self.next_tag_id = 0
+        # collect completion and sort keys first and sort them once
+        self.entry_completion = []
+        self.tag_completion = []
+        self.entry_orders = {order: [] for order in ORDER_TYPES}
+        self.tag_orders = {order: [] for order in ORDER_TYPES}
+        for k, v in tags.items():
+            self.add_tag(k, v)
+        for k, v in entries.items():
+            self.add_entry(k, v)
+        self.entry_completion = PrefixIndex(self.entry_completion)
+        self.tag_completion = PrefixIndex(self.tag_completion)
+        self.entry_orders = {order: SortOrder(keys) for order, keys in self.entry_orders.items()}
+        self.tag_orders = {order: SortOrder(keys) for order, keys in self.tag_orders.items()}
+
+    def add_entry(self, entry_id, entry):
+        title = entry['title']; username = entry['username']
+        tag_ids = [str(t) for t in entry['tags']] or [ALL_TAG]
+        self.entry_titles.setdefault(title, {})[entry_id] = None
+        self.entry_logins.setdefault((title, username), {})[entry_id] = None
+        for tag_id in tag_ids:
+            self.tag_entries.setdefault(tag_id, {})[entry_id] = None
+        self.indexed_entries[entry_id] = (title, username, tag_ids)
+        self.next_entry_id = self.__next_id(self.next_entry_id, entry_id)
+        for order, sort_order in self.entry_orders.items():
+            self.__add_sort_key(sort_order, sort_key(order, entry_id, title), entry_id)
+        for tag_id in tag_ids:
+            self.__add_completion(self.entry_completion, self.__entry_completion(entry_id, tag_id))
+
+    def remove_entry(self, entry_id):
+        if entry_id not in self.indexed_entries:
+            return
+        title, username, tag_ids = self.indexed_entries.pop(entry_id)
+        for order, sort_order in self.entry_orders.items():
+            sort_order.remove(sort_key(order, entry_id, title), entry_id)
+        self.__discard(self.entry_titles, title, entry_id)
+        self.__discard(self.entry_logins, (title, username), entry_id)
+        for tag_id in tag_ids:
+            self.__remove_completion(self.entry_completion, self.__completion_string(tag_id, title, username, entry_id))
+            self.__discard(self.tag_entries, tag_id, entry_id)
+
+    def update_entry(self, entry_id, entry):
+        self.remove_entry(entry_id)
+        self.add_entry(entry_id, entry)
+
+    def add_tag(self, tag_id, tag):
+        self.tag_titles.setdefault(tag['title'], {})[tag_id] = None
+        self.indexed_tags[tag_id] = tag['title']
+        self.next_tag_id = self.__next_id(self.next_tag_id, tag_id)
+        for order, sort_order in self.tag_orders.items():
+            self.__add_sort_key(sort_order, sort_key(order, tag_id, tag['title']), tag_id)
+        self.__add_completion(self.tag_completion, tag['title'] + '/')
+        for entry_id in self.tag_entries.get(tag_id, {}):
+            self.__add_completion(self.entry_completion, self.__entry_completion(entry_id, tag_id))
+
+    def remove_tag(self, tag_id):
+        if tag_id not in self.indexed_tags:
+            return
+        title = self.indexed_tags.pop(tag_id)
+        for order, sort_order in self.tag_orders.items():
+            sort_order.remove(sort_key(order, tag_id, title), tag_id)
+        self.__discard(self.tag_titles, title, tag_id)
+        self.__remove_completion(self.tag_completion, title + '/')
+        for entry_id in self.tag_entries.get(tag_id, {}):
+            entry_title, username, tag_ids = self.indexed_entries[entry_id]
+            self.__remove_completion(self.entry_completion, self.__completion_string(tag_id, entry_title, username, entry_id, title))
+
+    def update_tag(self, tag_id, tag):
+        self.remove_tag(tag_id)
+        self.add_tag(tag_id, tag)
+
+    def new_entry_id(self):
+        return str(self.next_entry_id)
+
+    def new_tag_id(self):
+        return str(self.next_tag_id)
+
+    def find_entry(self, title, username=''):
+        if username == '':
+            ids = self.entry_titles.get(title)
+        else:
+            ids = self.entry_logins.get((title, username))
+        if not ids:
+            return None
+        return next(iter(ids))
+
+    def find_tag(self, title):
+        ids = self.tag_titles.get(title)
+        if not ids:
+            return None
+        return next(iter(ids))
+
+    def entry_ids_by_tag(self, tag_id, order=None):
+        ids = list(self.tag_entries.get(str(tag_id), {}))
+        if order in ORDER_TYPES:
+            ids.sort(key=lambda entry_id: sort_key(order, entry_id, self.indexed_entries[entry_id][0]))
+        return ids
+
+    def entry_ids(self, order):
+        return self.entry_orders[order].ids()
+
+    def tag_ids(self, order):
+        return self.tag_orders[order].ids()
+
+    def complete_entries(self, incomplete):
+        '''Case insensitive substring matches, like Tag/github.com:user#id for github'''
+        return [k.split('\0', 1)[1] for k in self.entry_completion.search(incomplete.lower())]
+
+    def complete_tags(self, incomplete):
+        return [k.split('\0', 1)[1] for k in self.tag_completion.search(incomplete.lower())]
+
+    def __entry_completion(self, entry_id, tag_id):
+        title, username, tag_ids = self.indexed_entries[entry_id]
+        return self.__completion_string(tag_id, title, username, entry_id)
+
+    def __completion_string(self, tag_id, title, username, entry_id, tag_title=None):
+        if tag_title is None:
+            tag_title = self.indexed_tags.get(tag_id)
+        if tag_title is None:
+            return None
+        return tag_title + '/' + title + ':' + username + '#' + entry_id
+
+    @staticmethod
+    def __next_id(next_id, item_id):
+        if item_id.isdigit() and int(item_id) >= next_id:
+            return int(item_id) + 1
+        return next_id
+
+    # case insensitive lookup, the original string follows the lowercase key
+    @staticmethod
+    def __add_completion(completion, key):
+        if key is None:
+            return
+        if isinstance(completion, list):
+            completion.append(key.lower() + '\0' + key)
+        else:
+            completion.add(key.lower() + '\0' + key)
+
+    @staticmethod
+    def __add_sort_key(sort_order, key, item_id):
+        if isinstance(sort_order, list):
+            sort_order.append((key, item_id))
+        else:
+            sort_order.add(key, item_id)
+
+    @staticmethod
+    def __remove_completion(completion, key):
+        if key is not None:
+            completion.remove(key.lower() + '\0' + key)
+
+    @staticmethod
+    def __discard(table, key, value):
+        values = table.get(key)
+        if values is not None:
+            values.pop(value, None)
+            if not values:
+                del table[key]
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import os
+import struct
+from src import atomic
+
+'''
+Append-only change log next to the password file. Every save appends one
+record with the changed entries and tags, encrypted by the caller. The
+header holds the sha256 of the password file the records apply to, a
+journal left over from another version of the password file is ignored.
+'''
+
+MAGIC = b'TPJ1'
+DIGEST_BYTES = 32
+RECORD_LENGTH = struct.Struct('>I')
+
+def journal_file(pwd_file):
+    return pwd_file + '.journal'
+
+def stat(path):
+    '''(mtime, size) to notice changes, None if there is no journal'''
+    if not os.path.isfile(path):
+        return None
+    st = os.stat(path)
+    return (st.st_mtime, st.st_size)
+
+def create(path, digest):
+    atomic.write_file(path, MAGIC + bytes.fromhex(digest))
+
+def append(path, record):
+    with open(path, 'ab') as f:
+        f.write(RECORD_LENGTH.pack(len(record)) + record)
+        f.flush()
+        os.fsync(f.fileno())
+
+def read(path, digest):
+    '''Records of the journal, None if it belongs to another password file'''
+    with open(path, 'rb') as f:
+        data = f.read()
+    header = MAGIC + bytes.fromhex(digest)
+    if not data.startswith(header):
+        return None
+    records = []
+    data = memoryview(data)
+    pos = len(header)
+    while pos + RECORD_LENGTH.size <= len(data):
+        length, = RECORD_LENGTH.unpack_from(data, pos)
+        if pos + RECORD_LENGTH.size + length > len(data):
+            break
+        records.append(bytes(data[pos + RECORD_LENGTH.size:pos + RECORD_LENGTH.size + length]))
+        pos = pos + RECORD_LENGTH.size + length
+    if pos != len(data):
+        # torn write of the last record, it was never acknowledged, cut it
+        # off so the next record goes behind the last complete one
+        with open(path, 'r+b') as f:
+            f.truncate(pos)
+    return records
+
+def apply(db_json, change):
+    '''change maps entries and tags to {id: value}, None removes the id'''
+    for kind in ['entries', 'tags']:
+        for k, v in change.get(kind, {}).items():
+            if v is None:
+                db_json[kind].pop(k, None)
+            else:
+                db_json[kind][k] = v
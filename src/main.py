@@ -1,23 +1,41 @@
 #!/usr/bin/env python3
 import click
 import collections
+import concurrent.futures
+import contextlib
 import csv
+import gzip
+import io
 import logging
 import operator
 import os
-import pyperclip
+import queue
 import re
+import secrets
+import socket
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import uuid
-try:
-    import simplejson as json
-except:
-    import json
+from src import lazy_import
+from src import agent
+from src import atomic
+from src import cache
+from src import completion
 from src import crypto
+from src import daemon
+from src import index
+from src import journal
+from src import pattern
+from src import timing
+from src import transfer
 from src import trezor
+from src import wordlist
+
+json = lazy_import('simplejson', 'json')
+pyperclip = lazy_import('pyperclip')
 
 '''
 Config variables
@@ -33,6 +51,9 @@ CONFIG_FILE = os.path.join(CONFIG_PATH, 'config.json')
 DICEWARE_FILE = os.path.join(CONFIG_PATH, 'wordlist.txt')
 LOG_FILE = os.path.join(CONFIG_PATH, 'tpass.log')
 LOCK_FILE = os.path.join(CONFIG_PATH, 'lockfile')
+AGENT_SOCKET = os.path.join(CONFIG_PATH, 'agent.sock')
+DAEMON_SOCKET = os.path.join(CONFIG_PATH, 'daemon.sock')
+SESSION_KEY_FILE = os.path.join(CONFIG_PATH, 'session.key')
 # Actual Files
 ICONS = {'home':u'\U0001f3e0', 'person-stalker':u'\U0001F469\u200D\U0001F467', 'social-bitcoin':'₿', 'person':u'\U0001F642', 'star':u'\u2B50', 'flag':u'\U0001F3F3', 'heart':u'\u2764', 'settings':u'\u2699', 'email':u'\u2709', 'cloud':u'\u2601', 'alert-circled':u'\u26a0', 'android-cart':u'\U0001f6d2', 'image':u'\U0001F5BC', 'card':u'\U0001f4b3', 'earth':u'\U0001F310', 'wifi':u'\U0001f4f6'}
 CONFIG = {'fileName': '', 'path': DEFAULT_PATH, 'useGit': False, 'clipboardClearTimeSec': 15, 'storeMetaDataOnDisk': True, 'orderType': 'date', 'showIcons': False}
@@ -40,6 +61,13 @@ LOCK = {'uuid':uuid.uuid4().int}
 # Constants
 ENC_ENTROPY_BYTES = 12
 NONCE_ENTROPY_BYTES = 32
+DECRYPT_WORKERS = 4
+# decrypted entries match_entries keeps ready ahead of the caller
+LOOKAHEAD = 2 * DECRYPT_WORKERS
+# seconds an early stop of match_entries waits for the producer thread
+STOP_TIMEOUT = 0.1
+JOURNAL_MAX_RECORDS = 64
+IMPORT_BATCH_ENTRIES = 64
 
 '''
 Instance variables
@@ -48,9 +76,17 @@ tags = {'0': {'title': 'All', 'icon': 'home'},}
 entries = {}
 db_json = {'version': '0.0.1', 'extVersion': '0.6.0', 'config': {'orderType': 'date'}, 'tags': tags, 'entries': entries}
 client = trezor.TrezorDevice()
+store_index = None
 pwd_last_change_time = 0
 pwd_file = None
 tmp_file = None
+completion_file = None
+search_file = None
+journal_file = None
+journal_last_stat = None
+journal_records = 0
+pwd_digest = None
+changes = {'entries': {}, 'tags': {}}
 
 '''
 Helper Methods
@@ -63,7 +99,7 @@ def write_lockfile():
         json.dump(LOCK, f)
 
 def load_config():
-    global CONFIG; global tmp_file; global pwd_file
+    global CONFIG; global tmp_file; global pwd_file; global completion_file; global search_file; global journal_file
     if not os.path.isfile(CONFIG_FILE):
         write_config()
     with open(CONFIG_FILE) as f:
@@ -71,27 +107,37 @@ def load_config():
     if 'fileName' not in CONFIG or 'path' not in CONFIG or 'storeMetaDataOnDisk' not in CONFIG or 'orderType' not in CONFIG:
         handle_exception('CONFIG_PARSE_ERROR')
     pwd_file = os.path.join(CONFIG['path'], CONFIG['fileName'])
+    journal_file = journal.journal_file(pwd_file)
     if CONFIG['storeMetaDataOnDisk'] is True:
-        tmp_file = os.path.join(TMP_PATH, CONFIG['fileName'] + '.json')
+        tmp_file = os.path.join(TMP_PATH, CONFIG['fileName'] + '.cache')
         if not os.path.exists(TMP_PATH):
-            tmp_file = os.path.join(tempfile.gettempdir(), CONFIG['fileName'] + '.json')
+            tmp_file = os.path.join(tempfile.gettempdir(), CONFIG['fileName'] + '.cache')
             logging.warning('/dev/shm not found on host, using not as secure /tmp for metadata')
+        completion_file = completion.index_file(tmp_file)
+        search_file = os.path.splitext(tmp_file)[0] + '.search'
+
+def connect_daemon():
+    global client
+    if daemon.is_running(DAEMON_SOCKET):
+        client = daemon.RemoteDevice(DAEMON_SOCKET)
 
 def write_config():
     if not os.path.exists(CONFIG_PATH):    
         os.mkdir(CONFIG_PATH)
-    with open(CONFIG_FILE, 'w', encoding='utf8') as f:
-        json.dump(CONFIG, f, indent=4)
+    atomic.write_file(CONFIG_FILE, json.dumps(CONFIG, indent=4).encode('utf8'))
  
 def unlock_storage():
-    global db_json; global entries; global tags; global pwd_last_change_time
+    global db_json; global entries; global tags; global pwd_last_change_time; global store_index
+    global journal_last_stat; global journal_records; global pwd_digest
     if CONFIG['fileName'] == '' or not os.path.isfile(pwd_file):
         handle_exception('NOT_INITIALIZED')
-    
-    tmp_need_update = not os.path.isfile(tmp_file) or (os.path.isfile(tmp_file) and (os.path.getmtime(tmp_file) < os.path.getmtime(pwd_file)))
-    if CONFIG['storeMetaDataOnDisk'] is False or ( CONFIG['storeMetaDataOnDisk'] is True and tmp_need_update ):
+
+    payload = None
+    if CONFIG['storeMetaDataOnDisk'] is True:
+        payload = cache.load(tmp_file, SESSION_KEY_FILE, pwd_file, journal_file)
+    if payload is None:
         try:
-            keys = client.getTrezorKeys()
+            keys = get_trezor_keys()
             encKey = keys[2]
         except Exception as ex:
             handle_exception('TREZOR_KEY_ERROR', ex)
@@ -99,25 +145,79 @@ def unlock_storage():
             db_json = crypto.decryptStorage(pwd_file, encKey)
         except Exception as ex:
             handle_exception('PASSWORD_UNLOCK_READ_ERROR', ex)
-        entries = db_json['entries']; tags = db_json['tags']; db_json['config']['orderType'] = CONFIG['orderType'] 
-        if CONFIG['storeMetaDataOnDisk'] is True:
-            with open(tmp_file, 'w') as f:
-                json.dump(db_json, f)
-    
-    if CONFIG['storeMetaDataOnDisk'] is True:
-        with open(tmp_file) as f:
-            db_json = json.load(f)
-            entries = db_json['entries']; tags = db_json['tags']
-    if CONFIG['orderType'] == 'title':
-        entries = collections.OrderedDict(sorted(entries.items(), key=lambda v: v[1]['title']))
-        tags = collections.OrderedDict(sorted(tags.items(), key=lambda v: v[1]['title']))
-    elif CONFIG['orderType'] == 'date':
-        entries = collections.OrderedDict(sorted(entries.items()))
-        tags = collections.OrderedDict(sorted(tags.items()))
+        pwd_digest = None
+        if CONFIG.get('useJournal') is True or os.path.isfile(journal_file):
+            pwd_digest = cache.file_digest(pwd_file)
+        try:
+            journal_records = replay_journal(encKey)
+        except Exception as ex:
+            handle_exception('PASSWORD_UNLOCK_READ_ERROR', ex)
+        db_json['config']['orderType'] = CONFIG['orderType']
+    else:
+        db_json = payload['db_json']
+        pwd_digest = payload['digest']
+        journal_records = payload.get('journal_records', 0)
+    entries = db_json['entries']; tags = db_json['tags']
+    # the index holds both sort orders, it is cached with the metadata
+    store_index = payload.get('store_index') if payload is not None else None
+    if store_index is None:
+        store_index = index.StoreIndex(entries, tags)
+    if CONFIG['storeMetaDataOnDisk'] is True and payload is None:
+        cache.write(tmp_file, SESSION_KEY_FILE, pwd_file, cache_payload(), journal_file=journal_file, digest=pwd_digest)
+    if CONFIG['storeMetaDataOnDisk'] is True and (payload is None or not os.path.isfile(completion_file)):
+        completion.write(completion_file, store_index)
     pwd_last_change_time = os.path.getmtime(pwd_file)
+    journal_last_stat = journal.stat(journal_file)
 
-def save_storage():
-    global CONFIG
+def replay_journal(encKey):
+    '''Applies the journal to db_json, returns the number of records'''
+    if not os.path.isfile(journal_file):
+        return 0
+    records = journal.read(journal_file, pwd_digest)
+    if records is None:
+        logging.warning('journal belongs to another version of the password file, ignored: ' + journal_file)
+        return 0
+    key = bytes.fromhex(encKey)
+    for record in records:
+        journal.apply(db_json, json.loads(crypto.decryptSessionData(record, key).decode('utf8')))
+    return len(records)
+
+def cache_payload():
+    return {'db_json': db_json, 'store_index': store_index, 'journal_records': journal_records}
+
+def ordered_entries():
+    return [(k, entries[k]) for k in store_index.entry_ids(order_type())]
+
+def ordered_tags():
+    return collections.OrderedDict((k, tags[k]) for k in store_index.tag_ids(order_type()))
+
+def order_type():
+    return CONFIG['orderType'] if CONFIG['orderType'] in index.ORDER_TYPES else 'date'
+
+def mark_changed(kind, item_id):
+    '''Remembers an added, edited or removed entry or tag for the journal'''
+    changes[kind][item_id] = None
+
+def load_search_index():
+    '''
+    Full text index of the unlocked entries, kept next to the metadata cache and
+    rebuilt on first use after the password file changed
+    '''
+    if CONFIG['storeMetaDataOnDisk'] is True:
+        payload = cache.load(search_file, SESSION_KEY_FILE, pwd_file, journal_file)
+        if payload is not None:
+            return payload['search_index']
+    search_index = index.SearchIndex(entries)
+    if CONFIG['storeMetaDataOnDisk'] is True:
+        cache.write(search_file, SESSION_KEY_FILE, pwd_file, {'search_index': search_index}, journal_file=journal_file, digest=pwd_digest)
+    return search_index
+
+def save_storage(compact=False):
+    '''
+    Appends the changes to the journal if it is enabled, the whole store is
+    written when compact is set or the journal is full
+    '''
+    global CONFIG; global journal_records; global pwd_digest; global changes
     if not os.path.isfile(LOCK_FILE):
         handle_exception('LOCKFILE_DELETED')
     with open(LOCK_FILE) as f:
@@ -126,37 +226,67 @@ def save_storage():
         handle_exception('LOCKFILE_CHANGED')
     if not os.path.isfile(pwd_file) or os.path.getmtime(pwd_file) != pwd_last_change_time:
         handle_exception('PASSWORD_FILE_CHANGED')
+    if journal.stat(journal_file) != journal_last_stat:
+        handle_exception('PASSWORD_FILE_CHANGED')
     try:
-        keys = client.getTrezorKeys()
+        keys = get_trezor_keys()
         encKey = keys[2]
-        iv = client.getEntropy(ENC_ENTROPY_BYTES)
     except Exception as ex:
         handle_exception('TREZOR_DEVICE_ERROR', ex)
-    try:
-        crypto.encryptStorage(db_json, pwd_file, encKey, iv)
-    except Exception as ex:
-        handle_exception('PASSWORD_FILE_ENCRYPT_ERROR', ex)
+    pwd_data = None
+    if not compact and CONFIG.get('useJournal') is True and journal_records < JOURNAL_MAX_RECORDS:
+        try:
+            append_journal(encKey)
+        except Exception as ex:
+            handle_exception('PASSWORD_FILE_ENCRYPT_ERROR', ex)
+    else:
+        try:
+            iv = client.getEntropy(ENC_ENTROPY_BYTES)
+        except Exception as ex:
+            handle_exception('TREZOR_DEVICE_ERROR', ex)
+        try:
+            pwd_data = crypto.encryptStorage(db_json, pwd_file, encKey, iv)
+        except Exception as ex:
+            handle_exception('PASSWORD_FILE_ENCRYPT_ERROR', ex)
+        if os.path.isfile(journal_file):
+            os.remove(journal_file)
+        journal_records = 0
+        pwd_digest = None
+    changes = {'entries': {}, 'tags': {}}
     if CONFIG['storeMetaDataOnDisk'] is True:
-        with open(tmp_file, 'w') as f:
-            json.dump(db_json, f)
+        cache.write(tmp_file, SESSION_KEY_FILE, pwd_file, cache_payload(), pwd_data, journal_file, pwd_digest)
+        completion.write(completion_file, store_index)
     if CONFIG['useGit'] is True:
+        if os.path.isfile(journal_file):
+            subprocess.call(['git', 'add', os.path.basename(journal_file)], cwd=CONFIG['path'])
         subprocess.call('git commit -am "sync password-store"', cwd=CONFIG['path'], shell=True)
-        
+
+def append_journal(encKey):
+    global journal_records
+    change = {kind: {k: db_json[kind].get(k) for k in ids} for kind, ids in changes.items()}
+    if not change['entries'] and not change['tags']:
+        return
+    record = crypto.encryptSessionData(json.dumps(change).encode('utf8'), bytes.fromhex(encKey))
+    if journal_records == 0:
+        journal.create(journal_file, pwd_digest)
+    journal.append(journal_file, record)
+    journal_records = journal_records + 1
+
+def get_trezor_keys():
+    keys = agent.get_keys(AGENT_SOCKET)
+    if keys is None:
+        keys = client.getTrezorKeys()
+        agent.put_keys(AGENT_SOCKET, keys)
+    return keys
+
 def load_wordlist():
-    wordlist = DICEWARE_FILE
-    if not os.path.isfile(wordlist):
-        wordlist = os.path.join('.', 'wordlist.txt')
-    words = {}
+    path = DICEWARE_FILE
+    if not os.path.isfile(path):
+        path = os.path.join('.', 'wordlist.txt')
     try:
-        with open(wordlist) as f:
-            for line in f.readlines():
-                if re.compile('^([1-6]){5}\t(.)+$').match(line):
-                    key, value = line.rstrip('\n').split('\t')
-                    if(not key in words):
-                        words[key] = value
+        return wordlist.load(path, wordlist.cache_file(CONFIG_PATH))
     except Exception as ex:
         handle_exception('DICEWARE_FILE_PARSE_ERROR', ex)
-    return words
 
 def clear_clipboard():
     with click.progressbar(length=CONFIG['clipboardClearTimeSec'], \
@@ -173,9 +303,12 @@ def handle_exception(error, ex=None):
     clean_exit(ERROR_CODES[error]['code'])
 
 def clean_exit(exit_code=0):
+    remove_lockfile()
+    sys.exit(exit_code)
+
+def remove_lockfile():
     if os.path.isfile(LOCK_FILE):
         os.remove(LOCK_FILE)
-    sys.exit(exit_code)
 
 def start_logging(debug):
     logging.basicConfig(level=logging.DEBUG, filename=LOG_FILE, filemode='w', \
@@ -199,26 +332,24 @@ def get_entry(names):# TODO compare tags given
     tag = names[0]; title = names[1]; username = names[2]; entry_id = names[3]
     if entry_id != '' and entries.get(entry_id):
         return entry_id, entries[entry_id]
-    for k, v in entries.items():
-        if title == v['title']:
-            if username == '' or username == v['username']:
-                return k, v
+    entry_id = store_index.find_entry(title, username)
+    if entry_id is not None:
+        return entry_id, entries[entry_id]
     click.echo(click.style(' '.join(names), bold=True) + ' is not in the password store')
     return None
 
 def get_tag(tag_string):
-    for k, v in tags.items():
-        if tag_string == v['title']:
-            return k, v
+    tag_id = store_index.find_tag(tag_string)
+    if tag_id is not None:
+        return tag_id, tags[tag_id]
     click.echo(click.style(tag_string, bold=True) + ' is not a tag in the password store')
     return None
 
 def get_entries_by_tag(tag_id):
-    return dict(filter(lambda e: int(tag_id) in e[1]['tags'] \
-         or (int(tag_id) == 0 and  e[1]['tags'] == []), entries.items()))
+    return {k: entries[k] for k in store_index.entry_ids_by_tag(tag_id, order_type())}
 
 def get_tags_from_entry(e):
-    return dict(filter(lambda t: int(t[0]) in e[1]['tags'], tags.items()))
+    return {str(t): tags[str(t)] for t in e[1]['tags'] if str(t) in tags}
 
 def print_entries(es, includeTree=False):
     if includeTree:
@@ -256,40 +387,132 @@ def tags_to_string(ts, showIcons=False):
     return tags_str.strip()
 
 def unlock_entry(e):
-    entry_id = e[0]; entry = e[1]
-    if entry['export'] is True:
-        handle_exception('UNLOCK_ENTRY_ERROR')
-    entry['export'] = True
-    try:   
-        plain_nonce = client.getDecryptedNonce(entry)
-    except Exception as ex:
-        handle_exception('TREZOR_DEVICE_ERROR', ex)    
+    return next(unlock_entries([e]))
+
+def unlock_entries(es):
+    es = list(es)
+    for entry_id, entry in es:
+        if entry['export'] is True:
+            handle_exception('UNLOCK_ENTRY_ERROR')
+    plain_nonces = client.iterDecryptedNonces([entry for entry_id, entry in es])
+    for e in es:
+        try:
+            plain_nonce = next(plain_nonces)
+        except Exception as ex:
+            handle_exception('TREZOR_DEVICE_ERROR', ex)
+        yield decrypt_entry(e, plain_nonce)
+
+def decrypt_entry(e, plain_nonce):
     try:
-        entry['password']['data'] = crypto.decryptEntryValue(plain_nonce, entry['password']['data'])
-        entry['safe_note']['data'] = crypto.decryptEntryValue(plain_nonce, entry['safe_note']['data'])
+        decrypt_entry_values(e, plain_nonce)
     except Exception as ex:
         handle_exception('DECRYPT_ENTRY_ERROR', ex)
     return e
 
-def lock_entry(e):
+def decrypt_entry_values(e, plain_nonce):
     entry_id = e[0]; entry = e[1]
-    if entry['export'] is False:
-        handle_exception('LOCK_ENTRY_ERROR')
-    entry['export'] = False
+    entry['export'] = True
+    entry['password']['data'] = crypto.decryptEntryValue(plain_nonce, entry['password']['data'])
+    entry['safe_note']['data'] = crypto.decryptEntryValue(plain_nonce, entry['safe_note']['data'])
+    return e
+
+def match_entries(es, matcher):
+    '''
+    Decrypts entries and yields (entry, matcher(entry)) in the order of es.
+    A producer thread keeps the device busy with nonce decryption while a thread
+    pool decrypts the values, at most LOOKAHEAD entries ahead of the caller.
+    '''
+    es = list(es)
+    for entry_id, entry in es:
+        if entry['export'] is True:
+            handle_exception('UNLOCK_ENTRY_ERROR')
+    pending = queue.Queue(maxsize=LOOKAHEAD)
+    stopped = threading.Event()
+
+    def decrypt_and_match(e, plain_nonce):
+        decrypt_entry_values(e, plain_nonce)
+        return e, matcher(e)
+
+    def put(item):
+        # gives up once the caller stopped, nobody takes items from the queue then
+        while not stopped.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce(pool):
+        plain_nonces = None
+        try:
+            plain_nonces = client.iterDecryptedNonces([entry for entry_id, entry in es])
+            for e, plain_nonce in zip(es, plain_nonces):
+                if stopped.is_set():
+                    return
+                put(pool.submit(decrypt_and_match, e, plain_nonce))
+            put(None)
+        except Exception as ex:
+            put(ex)
+        finally:
+            if hasattr(plain_nonces, 'close'):
+                plain_nonces.close()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=DECRYPT_WORKERS) as pool:
+        producer = threading.Thread(target=produce, args=(pool,), daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    handle_exception('TREZOR_DEVICE_ERROR', item)
+                try:
+                    result = item.result()
+                except Exception as ex:
+                    handle_exception('DECRYPT_ENTRY_ERROR', ex)
+                yield result
+        finally:
+            # the caller stopped early or failed, drop the queued work. The producer
+            # can wait for a confirmation on the device, it ends after that on its own.
+            stopped.set()
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, concurrent.futures.Future):
+                    item.cancel()
+            producer.join(STOP_TIMEOUT)
+
+def lock_entry(e):
+    return lock_entries([e])[0]
+
+def lock_entries(es):
+    '''
+    Encrypts entries, entropy for all of them comes with one device request
+    and the nonces are encrypted in one device session
+    '''
+    for entry_id, entry in es:
+        if entry['export'] is False:
+            handle_exception('LOCK_ENTRY_ERROR')
+        entry['export'] = False
     try:
-        entropy = client.getEntropy(NONCE_ENTROPY_BYTES)
-        entry['nonce'] = client.getEncryptedNonce(entry, entropy)
-        plain_nonce = client.getDecryptedNonce(entry)
+        chunks = client.getEntropyChunks([NONCE_ENTROPY_BYTES, ENC_ENTROPY_BYTES, ENC_ENTROPY_BYTES] * len(es))
+        nonces = client.getEncryptedNonces([entry for entry_id, entry in es], chunks[0::3])
     except Exception as ex:
         handle_exception('TREZOR_DEVICE_ERROR', ex)
-    try:
-        iv_pwd = client.getEntropy(ENC_ENTROPY_BYTES)
-        entry['password']['data'] = crypto.encryptEntryValue(plain_nonce, json.dumps(entry['password']['data']), iv_pwd)
-        iv_secret = client.getEntropy(ENC_ENTROPY_BYTES)
-        entry['safe_note']['data'] = crypto.encryptEntryValue(plain_nonce, json.dumps(entry['safe_note']['data']), iv_secret)
-    except Exception as ex:
-        handle_exception('ENCRYPT_ENTRY_ERROR', ex)
-    return e
+    encoding = CONFIG.get('entryEncoding', 'Buffer')
+    for i, (entry_id, entry) in enumerate(es):
+        entropy, iv_pwd, iv_secret = chunks[3 * i:3 * i + 3]
+        entry['nonce'] = nonces[i]
+        plain_nonce = crypto.getPlainNonce(entropy)
+        try:
+            entry['password'] = {'type': encoding, 'data': crypto.encryptEntryValue(plain_nonce, json.dumps(entry['password']['data']), iv_pwd, encoding)}
+            entry['safe_note'] = {'type': encoding, 'data': crypto.encryptEntryValue(plain_nonce, json.dumps(entry['safe_note']['data']), iv_secret, encoding)}
+        except Exception as ex:
+            handle_exception('ENCRYPT_ENTRY_ERROR', ex)
+    return es
 
 def insert_entry(e):
     global entries
@@ -297,11 +520,10 @@ def insert_entry(e):
     if entry['export'] is True:
         e = lock_entry(e)
     if entry_id == '':
-        for k in entries.keys():
-            entry_id = str(int(k) + 1)
-        if entry_id == '':
-            entry_id = '0'
+        entry_id = store_index.new_entry_id()
     entries.update( {entry_id : entry} )
+    store_index.update_entry(entry_id, entry)
+    mark_changed('entries', entry_id)
 
 def edit_entry(e):#TODO don't show <All>
     entry = e[1]
@@ -327,9 +549,9 @@ def edit_entry(e):#TODO don't show <All>
         entry['title'] = edit_json['item/url*']; entry['note'] = edit_json['title']; entry['username'] = edit_json['username']; entry['password']['data'] = edit_json['password']; entry['safe_note']['data'] = edit_json['secret']
         entry['tags'] = []
         for t in edit_json['tags']['inUse']:
-            for k, v in tags.items():
-                if t == v['title'] and t != 'All':
-                    entry['tags'].append(int(k))
+            tag_id = store_index.find_tag(t)
+            if tag_id is not None and t != 'All':
+                entry['tags'].append(int(tag_id))
         #TODO dict(filter(lambda t: t in tags['title'] and t != 'All', ts))
         return lock_entry(e)
     handle_exception('ABORTED')
@@ -355,47 +577,50 @@ def insert_tag(t):
     global tags
     tag_id = t[0]; tag = t[1]
     if tag_id == '':
-        for k in tags.keys():
-            tag_id = str(int(k) + 1)
-        if tag_id == '':
-            tag_id = '0'
+        tag_id = store_index.new_tag_id()
     tags.update( {tag_id : tag} )
+    store_index.update_tag(tag_id, tag)
+    mark_changed('tags', tag_id)
 
-def remove_tag(t, recursiv=False):
-    global db_json; global entries
-    tag_id = t[0]; tag = t[1]
-    if tag_id == '0':
+def remove_items(entry_ids, tag_ids, recursiv=False):
+    '''
+    Removes entries and tags in one pass over the index, entries of removed
+    tags are removed too if recursiv, otherwise only untagged
+    '''
+    if '0' in tag_ids:
         handle_exception('REMOVE_ALL_TAG_ERROR')
-    del db_json['tags'][tag_id]
-    es = get_entries_by_tag(tag_id)
-    for e in es:
-        if recursiv is True:
-            del db_json['entries'][e[0]]
-        else:   
-            entries[e]['tags'].remove(int(tag_id))
-
+    entry_ids = dict.fromkeys(entry_ids)
+    untagged = {}
+    for tag_id in tag_ids:
+        for entry_id in store_index.entry_ids_by_tag(tag_id):
+            if recursiv is True:
+                entry_ids[entry_id] = None
+            else:
+                untagged[entry_id] = None
+    for tag_id in dict.fromkeys(tag_ids):
+        del tags[tag_id]
+        store_index.remove_tag(tag_id)
+        mark_changed('tags', tag_id)
+    for entry_id in entry_ids:
+        del entries[entry_id]
+        store_index.remove_entry(entry_id)
+        mark_changed('entries', entry_id)
+    removed_tags = {int(tag_id) for tag_id in tag_ids}
+    for entry_id in untagged:
+        if entry_id not in entry_ids:
+            entries[entry_id]['tags'] = [t for t in entries[entry_id]['tags'] if t not in removed_tags]
+            store_index.update_entry(entry_id, entries[entry_id])
+            mark_changed('entries', entry_id)
 
 '''
 CLI Helper Methods
 '''
 
 def tab_completion_entries(ctx, args, incomplete):
-    load_config()
-    unlock_storage() # TODO read tmp file
-    tabs = []
-    for k,v in tags.items():
-        es = get_entries_by_tag(k)
-        for kk,vv in es.items():
-            tabs.append(v['title'] + '/' + vv['title'] + ':' + vv['username'] + '#' + kk)
-    return [k for k in tabs if incomplete.lower() in k.lower()]
+    return completion.complete(completion.locate(CONFIG_FILE, TMP_PATH), completion.ENTRY, incomplete)
 
 def tab_completion_tags(ctx, args, incomplete):
-    load_config()
-    unlock_storage() # TODO read tmp file
-    tabs = []
-    for t in tags:
-        tabs.append(tags[t]['title'] + '/')
-    return [k for k in tabs if incomplete.lower() in k.lower()]
+    return completion.complete(completion.locate(CONFIG_FILE, TMP_PATH), completion.TAG, incomplete)
 
 def tab_completion_config(ctx, args, incomplete):
     load_config()
@@ -448,9 +673,12 @@ CLI Commands
 
 @click.group(cls=AliasedGroup, invoke_without_command=True)
 @click.option('--debug', is_flag=True, help='Show debug info')
+@click.option('--profile', is_flag=True, help='Show time per phase at exit')
+@click.option('--profile-format', default='text', type=click.Choice(['text', 'json']), help='format of the phase times')
+@click.option('--profile-dump', type=click.Path(dir_okay=False), help='write cProfile stats to file, for pstats')
 @click.version_option()
 @click.pass_context
-def cli(ctx, debug):
+def cli(ctx, debug, profile, profile_format, profile_dump):
     '''
     ------------------------------------\n
             tpass\n  
@@ -465,9 +693,18 @@ def cli(ctx, debug):
     https://github.com/makk4/tpass
     '''
 
+    if profile_dump:
+        ctx.call_on_close(timing.start_profiler(profile_dump))
+    if profile:
+        timing.enable()
+        # phase times go to stderr, stdout may be an export
+        ctx.call_on_close(lambda: click.echo(timing.report(profile_format), err=True))
     write_lockfile()
     start_logging(debug)
     load_config()
+    connect_daemon()
+    if profile:
+        timing.instrument(client, 'device')
     if ctx.invoked_subcommand is None:
         ctx = list_cmd()
 
@@ -492,7 +729,7 @@ def init_cmd(path, cloud, no_disk):
         CONFIG['useGit'] = True
         subprocess.call('git init', cwd=CONFIG['path'], shell=True)
     try:
-        keys = client.getTrezorKeys()
+        keys = get_trezor_keys()
         iv = client.getEntropy(ENC_ENTROPY_BYTES)
         CONFIG['fileName'] = keys[0]; encKey = keys[2]
     except Exception as ex:
@@ -514,30 +751,44 @@ def init_cmd(path, cloud, no_disk):
 @cli.command(name='find')
 @click.argument('search-string', type=click.STRING, nargs=1)
 def find_cmd(search_string):
-    '''List entries and tags that match names'''
+    '''List entries and tags that match names, best match first'''
     unlock_storage()
-    es = dict(filter(lambda e: search_string.lower() in e[1]['title'].lower() or search_string.lower() in e[1]['note'].lower() or search_string.lower() in e[1]['username'].lower(), entries.items()))
-    ts = dict(filter(lambda t: search_string.lower() in t[1]['title'].lower(), tags.items()))
+    es = {k: entries[k] for k in load_search_index().search(search_string)}
+    ts = dict(filter(lambda t: search_string.lower() in t[1]['title'].lower(), ordered_tags().items()))
     print_entries(es)
     print_tags(ts)
     clean_exit()
 
 @cli.command(name='grep')
-@click.option('--case-insensitive', '-i', is_flag=True, help='not case sensitive search')
-@click.argument('search-string', type=click.STRING, nargs=1)
-def grep_cmd(search_string, case_insensitive):
+@click.option('--case-insensitive', '-i', is_flag=True, help='not case sensitive search, the default')
+@click.option('--regex', '-E', is_flag=True, help='patterns are regular expressions')
+@click.option('--fixed-strings', '-F', is_flag=True, help='patterns are plain strings, the default')
+@click.option('--regexp', '-e', 'patterns', multiple=True, help='pattern to search for, can be repeated')
+@click.option('--file', '-f', 'pattern_file', type=click.File('r'), help='read patterns from file, one per line')
+@click.argument('search-string', type=click.STRING, nargs=1, required=False)
+def grep_cmd(search_string, case_insensitive, regex, fixed_strings, patterns, pattern_file):
     '''Search for search_strings in decrypted entries'''
+    patterns = list(patterns)
+    if search_string is not None:
+        patterns.append(search_string)
+    if pattern_file is not None:
+        patterns.extend(line.rstrip('\n') for line in pattern_file if line.rstrip('\n'))
+    if not patterns or (regex and fixed_strings):
+        handle_exception('PATTERN_ERROR')
+    try:
+        # grep was never case sensitive, -i is kept for scripts that pass it
+        matcher = pattern.compile_patterns(patterns, regex and not fixed_strings, ignore_case=True)
+    except re.error as ex:
+        handle_exception('PATTERN_ERROR', ex)
     unlock_storage()
-    for k, v in entries.items():
-        v = unlock_entry((k,v))[1]
-        for kk, vv in v.items():
-            if kk in ['title', 'note', 'usersearch_string']:
-                if search_string.lower() in vv.lower():
-                    click.echo(click.style(v['title'] + ':', bold=True) + click.style(v['usersearch_string'], bold=True, fg='green') + click.style('#' + k, bold=True, fg='magenta') + click.style('//<' + kk + '>//: ', fg='blue') + vv)
-        if search_string.lower() in v['password']['data'].lower():    
-            click.echo(click.style(v['title'] + ':', bold=True) + click.style(v['usersearch_string'], bold=True, fg='green') + click.style('#' + k, bold=True, fg='magenta') + click.style('//<password>//: ', fg='blue') + v['password']['data'])
-        if search_string.lower() in v['safe_note']['data'].lower():  
-            click.echo(click.style(v['title'] + ':', bold=True) + click.style(v['usersearch_string'], bold=True, fg='green') + click.style('#' + k, bold=True, fg='magenta') + click.style('//<secret>//: ', fg='blue') + v['safe_note']['data'])
+    fields = ['title', 'username', 'note', 'password', 'secret']
+    def match(e):
+        v = e[1]
+        values = [v['title'], v['username'], v['note'], v['password']['data'], v['safe_note']['data']]
+        return [(fields[i], values[i]) for i in pattern.matching_fields(matcher, values)]
+    for (k, v), matches in match_entries(ordered_entries(), match):
+        for field, value in matches:
+            click.echo(click.style(v['title'] + ':', bold=True) + click.style(v['username'], bold=True, fg='green') + click.style('#' + k, bold=True, fg='magenta') + click.style('//<' + field + '>//: ', fg='blue') + value)
     clean_exit()
 
 @cli.command(name='list')
@@ -546,7 +797,7 @@ def list_cmd(tag_string):
     '''List entries by tag'''
     unlock_storage()
     if tag_string == '':
-        print_tags(tags, True)
+        print_tags(ordered_tags(), True)
     else:
         t = get_tag(tag_string)
         if t is not None:
@@ -560,17 +811,20 @@ def list_cmd(tag_string):
 def show_cmd(entry_strings, secrets, json):
     '''Show entries'''
     unlock_storage()
+    es = []
     for name in entry_strings:
         e = get_entry(name)
-        if e is None:
-            continue
+        if e is not None:
+            es.append(e)
+    if secrets:
+        es = unlock_entries(es)
+    for e in es:
         entry = e[1]; entry_id = e[0]
 
         if not secrets:
             pwd = '********'
             safeNote = '********'
         else:
-            e = unlock_entry(e)
             pwd = entry['password']['data']
             safeNote = entry['safe_note']['data']
         if json:
@@ -621,24 +875,48 @@ def clip_cmd(user, url, secret, entry_string):
 @click.option('--seperator', '-s', default=' ', type=click.STRING, help='seperator for passphrase')
 @click.option('--force', '-f', is_flag=True, help='force without confirmation')
 @click.option('--entropy', '-d', is_flag=True, help='entropy from trezor device and host mixed')
+@click.option('--count', '-n', default=1, type=click.IntRange(min=1), help='number of passwords')
+@click.option('--format', '-F', 'output_format', default='text', type=click.Choice(['text', 'jsonl']), help='output format, one password per line')
 @click.argument('length', default=15, type=int)
-def generate_cmd(length, insert, type_, clip, seperator, force, entropy):
+def generate_cmd(length, insert, type_, clip, seperator, force, entropy, count, output_format):
     '''Generate new password'''
     global db_json
-    if (length < 6 and type_ is 'password') or (length < 3 and type_ is 'wordlist') or (length < 4 and type_ is 'pin'):
-        if not click.confirm('Warning: ' + length + ' is too short for password with type ' + type_ + '. Continue?'):
+    if type_ == 'password' and length < crypto.MIN_PASSWORD_LENGTH:
+        handle_exception('GENERATE_LENGTH_ERROR')
+    if (length < 6 and type_ == 'password') or (length < 3 and type_ == 'wordlist') or (length < 4 and type_ == 'pin'):
+        if not click.confirm('Warning: ' + str(length) + ' is too short for password with type ' + type_ + '. Continue?'):
             handle_exception('ABORTED')
-    if entropy:
-        entropy = client.getEntropy(length)
-    else:
-        entropy = None
+    if count > 1 and (insert or clip):
+        handle_exception('GENERATE_COUNT_ERROR')
     if type_ == 'wordlist':
         words = load_wordlist()
-        pwd = crypto.generatePassphrase(length, words, seperator)
+        alphabet_size = len(words)
     elif type_ == 'pin':
-        pwd = crypto.generatePin(length)
+        alphabet_size = 10
     elif type_ == 'password':
-        pwd = crypto.generatePassword(length)
+        alphabet_size = len(crypto.PASSWORD_CHARS)
+    source = secrets.token_bytes
+    if entropy:
+        def source(n):
+            try:
+                return client.getEntropy(n)
+            except Exception as ex:
+                handle_exception('TREZOR_DEVICE_ERROR', ex)
+    # one block for all passwords, more is only fetched if rejections used it up
+    reader = crypto.EntropyReader(source, crypto.entropyBytes(type_, length, count, alphabet_size))
+    for i in range(count):
+        if type_ == 'wordlist':
+            pwd = crypto.generatePassphrase(length, words, seperator, reader)
+        elif type_ == 'pin':
+            pwd = crypto.generatePin(length, reader)
+        elif type_ == 'password':
+            pwd = crypto.generatePassword(length, reader)
+        if clip or insert:
+            continue
+        if output_format == 'jsonl':
+            click.echo(json.dumps({'type': type_, 'password': pwd}))
+        else:
+            click.echo(pwd)
     if insert:
         unlock_storage()
         e = get_entry(insert)
@@ -653,34 +931,42 @@ def generate_cmd(length, insert, type_, clip, seperator, force, entropy):
     if clip:
         pyperclip.copy(pwd)
         clear_clipboard()
-    else:
+    elif insert:
         click.echo(pwd)
     clean_exit()
 
 @cli.command(name='remove')
-@click.option('--tag', '-t', type=TagName(), help='remove tag', nargs=1, autocompletion=tab_completion_tags)
+@click.option('--tag', '-t', type=TagName(), help='remove tag, can be repeated', multiple=True, autocompletion=tab_completion_tags)
 @click.option('--recursive', '-r', is_flag=True, help='recursive remove entries within tag')
 @click.option('--force', '-f', is_flag=True, help='force without confirmation')
 @click.argument('entry-strings', type=EntryName(), nargs=-1, autocompletion=tab_completion_entries)
-def remove_cmd(entry_strings, tag, recursive, force):# TODO make options TRU/FALSE tag
-    '''Remove entry or tag'''
+def remove_cmd(entry_strings, tag, recursive, force):
+    '''Remove entries or tags'''
     unlock_storage()
-    global db_json
-    if tag:
-        t = get_tag(tag)
+    entry_ids = []; tag_ids = []
+    for name in entry_strings:
+        e = get_entry(name)
+        if e is not None:
+            entry_ids.append(e[0])
+    for tag_string in tag:
+        t = get_tag(tag_string)
         if t is not None:
-            remove_tag(t, recursive)
-            if force or click.confirm('Delete tag: ' + click.style(t[1]['title'], bold=True)):
-                save_storage()
-    else:
-        names = []
-        for name in entry_strings:
-            e = get_entry(name)
-            if e is not None:
-                names.append(entries[e[0]]['title'])
-                del db_json['entries'][e[0]]
-        if force or click.confirm('Delete entries ' + click.style(', '.join(names), bold=True)):
-            save_storage()
+            tag_ids.append(t[0])
+    if '0' in tag_ids:
+        handle_exception('REMOVE_ALL_TAG_ERROR')
+    if not entry_ids and not tag_ids:
+        clean_exit()
+    question = []
+    if tag_ids:
+        question.append('tags ' + click.style(', '.join(tags[k]['title'] for k in tag_ids), bold=True))
+        if recursive:
+            count = len({e for k in tag_ids for e in store_index.entry_ids_by_tag(k)} - set(entry_ids))
+            question.append(str(count) + ' entries within')
+    if entry_ids:
+        question.append('entries ' + click.style(', '.join(entries[k]['title'] for k in entry_ids), bold=True))
+    if force or click.confirm('Delete ' + ' and '.join(question)):
+        remove_items(entry_ids, tag_ids, recursive)
+        save_storage()
     clean_exit()
 
 @cli.command(name='insert')
@@ -757,6 +1043,38 @@ def config_cmd(edit, reset, setting_name, setting_value):
             write_config()
     clean_exit()
 
+@cli.command(name='migrate')
+@click.option('--encoding', '-e', default='Buffer', type=click.Choice(crypto.ENTRY_ENCODINGS), help='encoding of encrypted entry values')
+@click.option('--force', '-f', is_flag=True, help='force without confirmation')
+def migrate_cmd(encoding, force):
+    '''Change storage format of encrypted entries'''
+    global CONFIG
+    unlock_storage()
+    if encoding != 'Buffer' and not force:
+        if not click.confirm('Trezor Password Manager can not read ' + encoding + ' encoded entries. Continue?'):
+            handle_exception('ABORTED')
+    for entry_id, entry in entries.items():
+        for field in ['password', 'safe_note']:
+            if entry[field].get('type') != encoding:
+                data = crypto.decodeEntryValue(entry[field]['data'])
+                entry[field] = {'type': encoding, 'data': crypto.encodeEntryValue(data, encoding)}
+    save_storage(compact=True)
+    CONFIG['entryEncoding'] = encoding
+    write_config()
+    click.echo(click.style('entries migrated to ', bold=True) + encoding)
+    clean_exit()
+
+@cli.command(name='compact')
+def compact_cmd():
+    '''Write journal into the password file'''
+    unlock_storage()
+    if not os.path.isfile(journal_file):
+        click.echo(click.style('nothing to compact', bold=True))
+        clean_exit()
+    save_storage(compact=True)
+    click.echo(click.style('journal written to: ', bold=True) + pwd_file)
+    clean_exit()
+
 @cli.command(name='unlock')
 def unlock_cmd():
     '''Unlock and write metadata to disk'''
@@ -766,58 +1084,164 @@ def unlock_cmd():
 @cli.command(name='lock')
 def lock_cmd():
     '''Remove metadata from disk'''
-    if os.path.isfile(tmp_file):
-        os.remove(tmp_file)
+    if tmp_file is None:
+        click.echo(click.style('nothing to delete', bold=True))
+        clean_exit()
+    # plaintext metadata written by older versions
+    legacy_file = os.path.splitext(tmp_file)[0] + '.json'
+    if os.path.isfile(legacy_file):
+        os.remove(legacy_file)
+    for index_file in [completion_file, search_file]:
+        if os.path.isfile(index_file):
+            os.remove(index_file)
+    if cache.remove(tmp_file, SESSION_KEY_FILE):
         click.echo(click.style('metadata deleted: ', bold=True) + tmp_file)
     else:
         click.echo(click.style('nothing to delete', bold=True)) 
+    if agent.forget_keys(AGENT_SOCKET):
+        click.echo(click.style('agent keys forgotten', bold=True))
     clean_exit()
 
-@cli.command(name='export')# TODO CSV
-@click.option('--path', '-p', default=os.path.expanduser('~'), type=click.Path(), help='path for export')
-@click.option('--file-format', '-f', default='json', type=click.Choice(['json', 'csv']), help='file format')
-def export_cmd(path, file_format):
+@cli.command(name='agent')
+@click.option('--ttl', '-t', default=600, type=int, help='seconds to keep keys, 0 keeps them until stopped')
+@click.option('--stop', '-s', is_flag=True, help='stop running agent')
+@click.option('--foreground', '-F', is_flag=True, help='do not fork into background')
+def agent_cmd(ttl, stop, foreground):
+    '''Keep keys in memory for the session'''
+    if stop:
+        if agent.stop(AGENT_SOCKET):
+            click.echo(click.style('agent stopped', bold=True))
+        else:
+            click.echo(click.style('no agent running', bold=True))
+        clean_exit()
+    if not hasattr(socket, 'AF_UNIX'):
+        handle_exception('AGENT_ERROR', 'unix sockets not supported on this platform')
+    if agent.is_running(AGENT_SOCKET):
+        click.echo(click.style('agent already running: ', bold=True) + AGENT_SOCKET)
+        clean_exit()
+    remove_lockfile()
+    if not foreground and hasattr(os, 'fork'):
+        if os.fork() != 0:
+            click.echo(click.style('agent started: ', bold=True) + AGENT_SOCKET)
+            sys.exit(0)
+        os.setsid()
+    try:
+        agent.KeyAgent(AGENT_SOCKET, ttl).serve()
+    except Exception as ex:
+        handle_exception('AGENT_ERROR', ex)
+    sys.exit(0)
+
+@cli.command(name='daemon')
+@click.option('--stop', '-s', is_flag=True, help='stop running daemon')
+def daemon_cmd(stop):
+    '''Keep trezor device connected for other commands'''
+    if stop:
+        if daemon.stop(DAEMON_SOCKET):
+            click.echo(click.style('daemon stopped', bold=True))
+        else:
+            click.echo(click.style('no daemon running', bold=True))
+        clean_exit()
+    if not hasattr(socket, 'AF_UNIX'):
+        handle_exception('DAEMON_ERROR', 'unix sockets not supported on this platform')
+    if isinstance(client, daemon.RemoteDevice):
+        click.echo(click.style('daemon already running: ', bold=True) + DAEMON_SOCKET)
+        clean_exit()
+    remove_lockfile()
+    try:
+        client.connect()
+        click.echo(click.style('daemon listening: ', bold=True) + DAEMON_SOCKET)
+        daemon.DeviceDaemon(DAEMON_SOCKET, client).serve()
+    except Exception as ex:
+        handle_exception('DAEMON_ERROR', ex)
+    sys.exit(0)
+
+@cli.command(name='export')
+@click.option('--path', '-p', default=os.path.expanduser('~'), type=click.Path(), help='file or directory for export, - for stdout')
+@click.option('--file-format', '-f', default='json', type=click.Choice(transfer.FORMATS), help='file format')
+@click.option('--compress', '-z', is_flag=True, help='gzip compress, also for paths ending in .gz')
+def export_cmd(path, file_format, compress):
     '''Export password store'''
-    global entries
-    unlock_storage()
-    export_passwords = {}
-    with click.progressbar(entries.items(), label='Decrypt entries', show_eta=False, fill_char='#', empty_char='-') as bar:
-        for e in bar:
-            e = unlock_entry(e)
-            export_passwords.update( {str(e[0]) : {'item/url*':e[1]['title'], 'title':e[1]['note'], 'username':e[1]['username'], 'password':e[1]['password']['data'], 'secret':e[1]['safe_note']['data'], 'tags':tags_to_string(get_tags_from_entry(e), False)} } )
-    if file_format == 'json':
-        with open(os.path.join(CONFIG_PATH, 'export.json'), 'w', encoding='utf8') as f:
-            json.dump(export_passwords, f)
-    elif file_format == 'csv':
-        edit_json = {'0': 'item/url*', '1': 'title', '2:':'username', '3:':'password', '4:':'username', '5:':'secret', '6:':'tags'}
-        edit_json = click.edit(json.dumps(edit_json, indent=4), require_save=True, extension='.json')
+    # device prompts go to stderr when the export is piped
+    redirect = contextlib.redirect_stdout(sys.stderr) if path == '-' else contextlib.ExitStack()
+    with redirect:
+        unlock_storage()
+        if path == '-':
+            target = contextlib.nullcontext(click.get_binary_stream('stdout'))
+        else:
+            if os.path.isdir(path):
+                path = os.path.join(path, 'export.' + file_format + ('.gz' if compress else ''))
+            compress = compress or path.endswith('.gz')
+            # a temporary file replaces the target when the export is complete
+            target = atomic.open_file(path, 0o600)
+        try:
+            with target as out:
+                stream = gzip.GzipFile(fileobj=out, mode='wb') if compress else out
+                f = io.TextIOWrapper(stream, encoding='utf8', newline='')
+                writer = transfer.ExportWriter(f, file_format)
+                with click.progressbar(unlock_entries(ordered_entries()), length=len(entries), label='Decrypt entries', show_eta=False, fill_char='#', empty_char='-', file=sys.stderr if path == '-' else None) as bar:
+                    for e in bar:
+                        writer.write(e[0], {'item/url*':e[1]['title'], 'title':e[1]['note'], 'username':e[1]['username'], 'password':e[1]['password']['data'], 'secret':e[1]['safe_note']['data'], 'tags':tags_to_string(get_tags_from_entry(e), False)})
+                writer.close()
+                f.detach()
+                if compress:
+                    stream.close()
+        except Exception as ex:
+            handle_exception('EXPORT_ERROR', ex)
+    if path != '-':
+        click.echo(click.style('exported to: ', bold=True) + path)
     clean_exit()
 
-@cli.command(name='import')# TODO CSV; check for file extension before parsing
-@click.argument('path-to-file', type=click.Path(), nargs=1)
-def import_cmd(path_to_file):
+@cli.command(name='import')
+@click.option('--file-format', '-f', type=click.Choice(transfer.FORMATS), help='file format, guessed from the file extension by default')
+@click.argument('path-to-file', type=click.Path(exists=True, dir_okay=False), nargs=1)
+def import_cmd(path_to_file, file_format):
     '''Import password store'''
     unlock_storage()
-    try:
-        if os.path.isfile(path_to_file):
-            with open(path_to_file) as f:
-                es = json.load(f)
-    except Exception as ex:
-        handle_exception('IMPORT_ERROR', ex)
-    with click.progressbar(es.items(), label='Decrypt entries', show_eta=False, fill_char='#', empty_char='-') as bar:    
-        for k,v in bar:
-            if 'item/url*' not in v or 'username' not in v or 'password' not in v or 'secret' not in v:
-                handle_exception('IMPORT_ERROR')
-            if not isinstance(v['item/url*'],str) or not isinstance(v['username'],str) or not isinstance(v['password'],str) or not isinstance(v['secret'],str):
-                handle_exception('IMPORT_ERROR')
-            if v['item/url*'] == '':
-                handle_exception('ITEM_FIELD_ERROR')
-            e = ('',{'title': v['item/url*'], 'username': v['username'], 'password': {'type': 'Buffer', 'data': v['password']}, 'nonce': '', 'tags': [], 'safe_note': {'type': 'Buffer', 'data': v['secret']}, 'note': v['title'], 'success': True, 'export': True})
-            insert_entry(e)
-            # TODO insert new tags from entries 
+    if file_format is None:
+        file_format = transfer.detect_format(path_to_file)
+    with open(path_to_file, 'rb') as raw:
+        # progress follows the bytes read from disk, also for gzip files
+        stream = gzip.GzipFile(fileobj=raw, mode='rb') if raw.peek(2)[:2] == b'\x1f\x8b' else raw
+        f = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        rows = transfer.batches(transfer.read_rows(f, file_format), IMPORT_BATCH_ENTRIES)
+        with click.progressbar(length=os.path.getsize(path_to_file), label='Import entries', show_eta=True, fill_char='#', empty_char='-') as bar:
+            row_number = 1
+            while True:
+                try:
+                    batch = next(rows, None)
+                    if batch is None:
+                        break
+                    transfer.validate(batch, row_number)
+                except Exception as ex:
+                    handle_exception('IMPORT_ERROR', ex)
+                import_entries(batch)
+                row_number = row_number + len(batch)
+                bar.update(raw.tell() - bar.pos)
+            bar.update(bar.length - bar.pos)
     save_storage()
     clean_exit()
 
+def import_entries(rows):
+    es = []
+    for row in rows:
+        es.append(('', {'title': row['item/url*'], 'username': row['username'], 'password': {'type': 'Buffer', 'data': row['password']}, 'nonce': '', 'tags': import_tags(row.get('tags') or ''), 'safe_note': {'type': 'Buffer', 'data': row['secret']}, 'note': row.get('title') or '', 'success': True, 'export': True}))
+    for e in lock_entries(es):
+        insert_entry(e)
+
+def import_tags(tag_string):
+    '''Ids of the tag titles, tags that do not exist yet are inserted'''
+    tag_ids = []
+    for title in tag_string.split():
+        if title == tags['0']['title']:
+            continue
+        tag_id = store_index.find_tag(title)
+        if tag_id is None:
+            insert_tag(('', {'title': title, 'icon': 'home'}))
+            tag_id = store_index.find_tag(title)
+        if int(tag_id) not in tag_ids:
+            tag_ids.append(int(tag_id))
+    return tag_ids
+
 
 ALIASES = {
     'cp': clip_cmd,
@@ -938,4 +1362,28 @@ ERROR_CODES = {
         'message':'Cannot remove <all> tag',
         'code':26
     },
+    'AGENT_ERROR':{
+        'message':'Error while running agent',
+        'code':27
+    },
+    'DAEMON_ERROR':{
+        'message':'Error while running daemon',
+        'code':28
+    },
+    'PATTERN_ERROR':{
+        'message':'Missing or invalid search pattern',
+        'code':29
+    },
+    'EXPORT_ERROR':{
+        'message':'Export gone wrong',
+        'code':30
+    },
+    'GENERATE_COUNT_ERROR':{
+        'message':'Only one password can be inserted or copied to clipboard',
+        'code':31
+    },
+    'GENERATE_LENGTH_ERROR':{
+        'message':'Passwords need at least ' + str(crypto.MIN_PASSWORD_LENGTH) + ' characters for lower and upper case letters and two digits',
+        'code':32
+    },
 }
\ No newline at end of file
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import re
+
+'''
+Combined matcher for grep, all patterns are compiled into one regular
+expression which runs once over every field of an entry
+'''
+
+def compile_patterns(patterns, regex=False, ignore_case=False):
+    '''
+    Fixed strings are merged into a trie shaped expression, so a long list of
+    strings costs about as much as the longest one, regular expressions are
+    joined as alternation
+    '''
+    patterns = list(patterns)
+    if regex:
+        expression = '|'.join('(?:' + p + ')' for p in patterns)
+    else:
+        expression = trie_expression(patterns)
+    return re.compile(expression, re.IGNORECASE if ignore_case else 0)
+
+def trie_expression(strings):
+    trie = {}
+    for s in strings:
+        node = trie
+        for c in s:
+            node = node.setdefault(c, {})
+        node[''] = None
+    return _node_expression(trie)
+
+def _node_expression(node):
+    alternatives = [re.escape(c) + _node_expression(node[c]) for c in sorted(node) if c != '']
+    optional = '' in node
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1 and not optional:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')' + ('?' if optional else '')
+
+def matching_fields(matcher, values):
+    '''
+    Indices of the values the matcher finds something in, every value is
+    searched on its own so ^ and $ anchor at the field and no match spans two
+    fields
+    '''
+    return [i for i, value in enumerate(values) if matcher.search(value) is not None]
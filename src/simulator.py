@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import collections
+import hashlib
+import hmac
+import time
+from src import trezor
+
+'''
+Simulated Trezor for tests and benchmarks without a device. The simulated
+client answers the protobuf messages trezorlib sends, so TrezorDevice runs
+its real code paths. Keys are derived from a seed and stay the same between
+runs, every round trip costs a configurable latency and every confirmation
+on the device an additional delay.
+'''
+
+DEFAULT_SEED = b'tpass simulator'
+# bytes a real device answers for one GetEntropy
+MAX_ENTROPY_RESPONSE = 1024
+
+class SimulatedClient:
+    '''
+    Stands in for trezorlib's TrezorClient, call() takes a request message
+    and returns the response message the firmware would send
+    '''
+    def __init__(self, seed=DEFAULT_SEED, latency=0.0, confirm_delay=0.0, sleep=True):
+        self.node_key = hashlib.sha256(b'node' + seed).digest()
+        self.entropy_seed = hashlib.sha256(b'entropy' + seed).digest()
+        self.latency = latency
+        self.confirm_delay = confirm_delay
+        self.sleep = sleep
+        self.calls = collections.Counter()
+        self.confirmations = 0
+        self.device_time = 0.0
+        self.entropy_counter = 0
+
+    def call(self, msg):
+        from trezorlib import messages
+        name = type(msg).__name__
+        self.calls[name] += 1
+        delay = self.latency
+        if isinstance(msg, messages.GetEntropy):
+            response = messages.Entropy(entropy=self.__entropy(min(msg.size, MAX_ENTROPY_RESPONSE)))
+        elif isinstance(msg, messages.CipherKeyValue):
+            if (msg.encrypt and msg.ask_on_encrypt) or (not msg.encrypt and msg.ask_on_decrypt):
+                self.confirmations += 1
+                delay = delay + self.confirm_delay
+            response = messages.CipheredKeyValue(value=self.__cipherKeyValue(msg))
+        else:
+            response = messages.Failure(message='Unexpected message ' + name)
+        self.device_time += delay
+        if self.sleep and delay > 0:
+            time.sleep(delay)
+        return response
+
+    def close(self):
+        pass
+
+    def __entropy(self, size):
+        self.entropy_counter += 1
+        return hashlib.shake_256(self.entropy_seed + self.entropy_counter.to_bytes(8, 'big')).digest(size)
+
+    def __cipherKeyValue(self, msg):
+        # same derivation as the firmware, the confirmation flags are part of the key
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.hazmat.backends import default_backend
+        if len(msg.value) % 16 != 0:
+            raise ValueError('Value length must be a multiple of 16')
+        data = msg.key.encode('utf8') + (b'E1' if msg.ask_on_encrypt else b'E0') + (b'D1' if msg.ask_on_decrypt else b'D0')
+        digest = hmac.new(self.node_key, data, hashlib.sha512).digest()
+        iv = msg.iv if msg.iv else digest[32:48]
+        cipher = Cipher(algorithms.AES(digest[:32]), modes.CBC(iv), backend=default_backend())
+        context = cipher.encryptor() if msg.encrypt else cipher.decryptor()
+        return context.update(msg.value) + context.finalize()
+
+    def reset_counters(self):
+        self.calls.clear()
+        self.confirmations = 0
+        self.device_time = 0.0
+
+class SimulatedDevice(trezor.TrezorDevice):
+    '''TrezorDevice connected to a SimulatedClient instead of an usb device'''
+    def __init__(self, seed=DEFAULT_SEED, latency=0.0, confirm_delay=0.0, sleep=True):
+        self.client = SimulatedClient(seed, latency, confirm_delay, sleep)
+
+    def disconnect(self):
+        # the simulated connection stays, counters are kept
+        pass
+
+    @property
+    def calls(self):
+        return self.client.calls
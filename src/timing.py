@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import collections
+import importlib
+import inspect
+import json
+import threading
+import time
+
+'''
+Phase timers for --profile. Functions of the phases are wrapped when
+profiling starts, without --profile nothing is wrapped and nothing is
+timed. Time inside a nested phase only counts for the inner one, so
+decrypting the metadata cache counts as crypto and not as disk. Worker
+threads are timed too, the phases can add up to more than the wall time.
+'''
+
+PHASES = ['device', 'crypto', 'json', 'disk', 'index', 'git']
+# phase, module, functions or (class, methods)
+INSTRUMENTED = [
+    ('crypto', 'src.crypto', ['decryptStorage', 'encryptStorage', 'decryptEntryValue', 'encryptEntryValue', 'encryptSessionData', 'decryptSessionData']),
+    ('json', 'json', ['load', 'loads', 'dump', 'dumps']),
+    ('json', 'simplejson', ['load', 'loads', 'dump', 'dumps']),
+    ('json', 'pickle', ['loads', 'dumps']),
+    ('disk', 'src.atomic', ['write_file']),
+    ('disk', 'src.cache', ['load', 'write', 'file_digest']),
+    ('disk', 'src.journal', ['append', 'read']),
+    ('disk', 'src.completion', ['write']),
+    ('index', 'src.index', [('StoreIndex', ['__init__', 'entry_ids', 'tag_ids', 'entry_ids_by_tag', 'find_entry', 'find_tag']), ('SearchIndex', ['__init__', 'search'])]),
+    ('git', 'subprocess', ['call']),
+]
+
+_dumps = json.dumps
+_lock = threading.Lock()
+_local = threading.local()
+_totals = collections.defaultdict(float)
+_calls = collections.Counter()
+_started = None
+
+def enable():
+    patched = _started is not None
+    reset()
+    if patched:
+        return
+    for phase, module_name, names in INSTRUMENTED:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        for name in names:
+            if isinstance(name, tuple):
+                cls = getattr(module, name[0])
+                for method in name[1]:
+                    setattr(cls, method, timed(phase, getattr(cls, method)))
+            else:
+                setattr(module, name, timed(phase, getattr(module, name)))
+
+def reset():
+    global _started
+    _started = time.perf_counter()
+    _totals.clear()
+    _calls.clear()
+
+def instrument(obj, phase):
+    '''
+    Times the public methods of an object, the device client. Calls are
+    counted where they reach the device, at call() of the trezorlib client
+    behind it, one per round trip. Objects without one, the daemon client,
+    send one request per method call.
+    '''
+    transport = getattr(getattr(obj, 'client', None), 'call', None)
+    for name in dir(obj):
+        attr = getattr(obj, name, None)
+        if not name.startswith('_') and inspect.ismethod(attr) and not hasattr(attr, '__wrapped__'):
+            setattr(obj, name, timed(phase, attr, count=transport is None))
+    if transport is not None and not hasattr(transport, '__wrapped__'):
+        obj.client.call = counted(phase, transport)
+
+def counted(phase, function):
+    '''Counts the calls without timing them, the time goes to the phase already running'''
+    def wrapper(*args, **kwargs):
+        with _lock:
+            _calls[phase] += 1
+        return function(*args, **kwargs)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+def timed(phase, function, count=True):
+    def wrapper(*args, **kwargs):
+        _enter(phase, count)
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            _exit(phase)
+        if inspect.isgenerator(result):
+            return _timed_iter(phase, result)
+        return result
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = getattr(function, '__name__', phase)
+    wrapper.__doc__ = getattr(function, '__doc__', None)
+    return wrapper
+
+def _timed_iter(phase, it):
+    # device answers come from generators, the time goes by with every item
+    while True:
+        _enter(phase, count=False)
+        try:
+            value = next(it)
+        except StopIteration:
+            return
+        finally:
+            _exit(phase)
+        yield value
+
+def _enter(phase, count=True):
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    now = time.perf_counter()
+    if stack:
+        # the outer phase pauses
+        _add(stack[-1][0], now - stack[-1][1])
+    stack.append([phase, now])
+    if count:
+        with _lock:
+            _calls[phase] += 1
+
+def _exit(phase):
+    stack = _local.stack
+    now = time.perf_counter()
+    _add(phase, now - stack.pop()[1])
+    if stack:
+        stack[-1][1] = now
+
+def _add(phase, seconds):
+    with _lock:
+        _totals[phase] += seconds
+
+def results():
+    total = time.perf_counter() - _started
+    phases = {p: {'calls': _calls[p], 'ms': _totals[p] * 1000} for p in PHASES}
+    return {'total_ms': total * 1000, 'other_ms': max(0.0, total - sum(_totals.values())) * 1000, 'phases': phases}
+
+def report(output_format='text'):
+    r = results()
+    if output_format == 'json':
+        return _dumps(r, indent=4)
+    lines = ['%-8s %8s %10s %6s' % ('phase', 'calls', 'ms', '%')]
+    for phase, p in r['phases'].items():
+        lines.append('%-8s %8d %10.1f %6.1f' % (phase, p['calls'], p['ms'], 100 * p['ms'] / r['total_ms']))
+    lines.append('%-8s %8s %10.1f %6.1f' % ('other', '', r['other_ms'], 100 * r['other_ms'] / r['total_ms']))
+    lines.append('%-8s %8s %10.1f' % ('total', '', r['total_ms']))
+    return '\n'.join(lines)
+
+def start_profiler(path):
+    '''cProfile of the whole command, returns the function that writes the stats'''
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    def stop():
+        profiler.disable()
+        profiler.dump_stats(path)
+    return stop
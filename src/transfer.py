@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import csv
+import itertools
+import os
+from src import lazy_import
+
+json = lazy_import('simplejson', 'json')
+
+'''
+Readers and writers for import and export files, rows are parsed and written
+one at a time so memory does not grow with the file size. A row has the
+fields of EXPORT_FIELDS, tags are the tag titles separated by spaces.
+'''
+
+EXPORT_FIELDS = ['item/url*', 'title', 'username', 'password', 'secret', 'tags']
+REQUIRED_FIELDS = ['item/url*', 'username', 'password', 'secret']
+FORMATS = ['json', 'jsonl', 'csv']
+READ_CHUNK_CHARS = 64 * 1024
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.gz':
+        return detect_format(path[:-len(extension)])
+    if extension == '.csv':
+        return 'csv'
+    if extension in ['.jsonl', '.ndjson']:
+        return 'jsonl'
+    return 'json'
+
+def read_rows(f, file_format):
+    '''f is a text file, opened with newline='' for csv'''
+    if file_format == 'csv':
+        return csv.DictReader(f)
+    if file_format == 'jsonl':
+        return (json.loads(line) for line in f if line.strip())
+    return iter_json(f)
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+def validate(rows, first_row=1):
+    '''Checks a batch of rows, raises ValueError naming the first bad one'''
+    for i, row in enumerate(rows, first_row):
+        if not isinstance(row, dict):
+            raise ValueError('row ' + str(i) + ': not an object')
+        missing = [k for k in REQUIRED_FIELDS if k not in row]
+        if missing:
+            raise ValueError('row ' + str(i) + ': missing ' + ', '.join(missing))
+        wrong = [k for k in EXPORT_FIELDS if k in row and not isinstance(row[k], str)]
+        if wrong:
+            raise ValueError('row ' + str(i) + ': no string ' + ', '.join(wrong))
+        if row['item/url*'] == '':
+            raise ValueError('row ' + str(i) + ': item/url* field is mandatory')
+
+def iter_json(f):
+    '''
+    Values of a top level json object, like the json export, or array, read
+    in chunks, only the current value has to fit into memory
+    '''
+    decoder = json.JSONDecoder()
+    buf = ''; pos = 0
+
+    def more():
+        nonlocal buf, pos
+        chunk = f.read(READ_CHUNK_CHARS)
+        buf = buf[pos:] + chunk; pos = 0
+        return chunk != ''
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos = pos + 1
+            if pos < len(buf) or not more():
+                return
+
+    def expect(chars):
+        nonlocal pos
+        skip_whitespace()
+        if pos == len(buf) or buf[pos] not in chars:
+            raise ValueError('expected ' + ' or '.join(chars) + ' in json')
+        pos = pos + 1
+        return buf[pos - 1]
+
+    def decode():
+        nonlocal pos
+        skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # value not complete yet
+                if not more():
+                    raise
+                continue
+            pos = end
+            return value
+
+    is_object = expect('{[') == '{'
+    close = '}' if is_object else ']'
+    skip_whitespace()
+    if pos < len(buf) and buf[pos] == close:
+        return
+    while True:
+        if is_object:
+            decode()
+            expect(':')
+        yield decode()
+        if expect(',' + close) == close:
+            return
+
+class ExportWriter:
+    '''
+    Writes every row as it comes, json in the format of the old export, an
+    object keyed by entry id. f is a text file opened with newline=''.
+    '''
+    def __init__(self, f, file_format):
+        self.f = f
+        self.file_format = file_format
+        self.rows = 0
+        if file_format == 'csv':
+            self.writer = csv.DictWriter(f, EXPORT_FIELDS, extrasaction='ignore')
+            self.writer.writeheader()
+        elif file_format == 'json':
+            f.write('{')
+
+    def write(self, key, row):
+        if self.file_format == 'csv':
+            self.writer.writerow(row)
+        elif self.file_format == 'jsonl':
+            self.f.write(json.dumps(row) + '\n')
+        else:
+            self.f.write((',' if self.rows else '') + '\n    ' + json.dumps(str(key)) + ': ' + json.dumps(row))
+        self.rows = self.rows + 1
+
+    def close(self):
+        if self.file_format == 'json':
+            self.f.write('\n}\n' if self.rows else '}\n')
+        self.f.flush()
@@ -5,28 +5,36 @@ import logging
 import os
 import random
 import sys
-from trezorlib import misc, ui
-from trezorlib.client import TrezorClient
-from trezorlib.tools import parse_path
-from trezorlib.transport import enumerate_devices
-from trezorlib.transport import get_transport
-from trezorlib.misc import get_entropy
-from trezorlib.misc import encrypt_keyvalue
 from urllib.parse import urlparse
 
-BIP32_PATH = parse_path("10016h/0")
+# parse_path("10016h/0"), trezorlib is only imported when the device is used
+BIP32_PATH = [10016 | 0x80000000, 0]
+MAX_ENTROPY_REQUEST = 1024
 
 class TrezorDevice:
     client = None
 
     def __getClient(self):
         if self.client is None:
+            from trezorlib import ui
+            from trezorlib.client import TrezorClient
             devices = self.__waitForDevices()
             transport = self.__chooseDevice(devices)
             self.client = TrezorClient(transport=transport, ui=ui.ClickUI())
 
+    def connect(self):
+        self.__getClient()
+
+    def disconnect(self):
+        if self.client is not None:
+            try:
+                self.client.close()
+            finally:
+                self.client = None
+
     # @author:satoshilabs
     def __waitForDevices(self):
+        from trezorlib.transport import enumerate_devices
         devices = enumerate_devices()
         while not len(devices):
             sys.stderr.write("Please connect Trezor to computer and press Enter...")
@@ -36,6 +44,8 @@ class TrezorDevice:
 
     # @author:satoshilabs
     def __chooseDevice(self, devices):
+        from trezorlib import ui
+        from trezorlib.client import TrezorClient
         if not len(devices):
             raise RuntimeError("No Trezor connected!")
 
@@ -81,6 +91,7 @@ class TrezorDevice:
 
     # @author:satoshilabs
     def __decryptMasterKey(self):
+        from trezorlib import misc
         self.__getClient()
         ENC_KEY = 'Activate TREZOR Password Manager?'
         ENC_VALUE = bytes.fromhex('2d650551248d792eabf628f451200d7f51cb63e46aadcbb1038aacb05e8c8aee2d650551248d792eabf628f451200d7f51cb63e46aadcbb1038aacb05e8c8aee')
@@ -97,6 +108,23 @@ class TrezorDevice:
     # @author:satoshilabs
     def getDecryptedNonce(self, entry):
         self.__getClient()
+        return self.__decryptNonce(entry)
+
+    def iterDecryptedNonces(self, entries):
+        '''
+        Decrypt nonces of several entries back-to-back over one connection,
+        yields each plain nonce as soon as the device answers
+        '''
+        self.__getClient()
+        for entry in entries:
+            yield self.__decryptNonce(entry)
+
+    def getDecryptedNonces(self, entries):
+        return list(self.iterDecryptedNonces(entries))
+
+    # @author:satoshilabs
+    def __decryptNonce(self, entry):
+        from trezorlib import misc
         if 'item' in entry:
             item = entry['item']
         else:
@@ -119,6 +147,7 @@ class TrezorDevice:
         return decrypted_nonce.hex()
 
     def getEncryptedNonce(self, entry, entropy):
+        from trezorlib import misc
         self.__getClient()
         if 'item' in entry:
             item = entry['item']
@@ -142,14 +171,39 @@ class TrezorDevice:
 
         return encrypted_nonce.hex()
 
+    def getEncryptedNonces(self, entries, entropies):
+        '''Nonces for many entries in one device session, encryption needs no confirmation'''
+        return [self.getEncryptedNonce(entry, entropy) for entry, entropy in zip(entries, entropies)]
+
     def getEntropy(self, length):
+        return self.getEntropyChunks([length])[0]
+
+    def getEntropyChunks(self, lengths):
+        '''
+        Fetch entropy for several values with one device request, every
+        chunk is mixed 50:50 from trezor and host like getEntropy
+        '''
+        from trezorlib import misc
         self.__getClient()
-        trezor_entropy = misc.get_entropy(self.client, length//2)
-        urandom_entropy = os.urandom(length//2)
-        entropy = trezor_entropy + urandom_entropy
-        if len(entropy) != length:
-            raise ValueError(str(length) + ' bytes entropy expected')
-        return entropy
+        total = sum(length//2 for length in lengths)
+        # the device answers at most MAX_ENTROPY_REQUEST bytes per request
+        trezor_entropy = b''
+        while len(trezor_entropy) < total:
+            entropy = misc.get_entropy(self.client, min(total - len(trezor_entropy), MAX_ENTROPY_REQUEST))
+            if not entropy:
+                raise ValueError('no entropy from device')
+            trezor_entropy += entropy
+        # the host adds the odd byte of odd lengths
+        urandom_entropy = os.urandom(sum(length - length//2 for length in lengths))
+        chunks = []; offset = 0; host_offset = 0
+        for length in lengths:
+            entropy = trezor_entropy[offset:offset + length//2] + urandom_entropy[host_offset:host_offset + length - length//2]
+            if len(entropy) != length:
+                raise ValueError(str(length) + ' bytes entropy expected')
+            chunks.append(entropy)
+            offset = offset + length//2
+            host_offset = host_offset + length - length//2
+        return chunks
 
     def getTrezorKeys(self):
         self.__getClient()
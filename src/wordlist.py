@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import re
+from src import atomic
+
+'''
+Wordlist for passphrases, parsed once into a plain list of words and cached
+next to the config. The cache is used while the wordlist keeps its mtime and
+size, otherwise its sha256 decides whether it has to be parsed again. Lines
+are diceware lines, dice rolls and word separated by a tab, or just a word,
+so lists of any size work.
+'''
+
+CACHE_VERSION = 1
+DICE_LINE = re.compile(r'^[1-6]+\t(.+)$')
+# wordlists already loaded by this process
+_loaded = {}
+
+def parse(text):
+    '''Words in file order, a dice roll listed twice keeps its first word'''
+    words = []
+    rolls = set()
+    for line in text.splitlines():
+        m = DICE_LINE.match(line)
+        if m is not None:
+            roll = line.split('\t', 1)[0]
+            if roll in rolls:
+                continue
+            rolls.add(roll)
+            words.append(m.group(1))
+        elif line.strip() != '' and '\t' not in line:
+            words.append(line.strip())
+    return words
+
+def cache_file(config_path):
+    return os.path.join(config_path, 'wordlist.cache')
+
+def load(path, cache_path=None):
+    '''Words of the wordlist at path, ValueError if it has none'''
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    source = {'path': path, 'mtime': st.st_mtime_ns, 'size': st.st_size}
+    loaded = _loaded.get(path)
+    if loaded is not None and loaded[0] == source:
+        return loaded[1]
+    header, words = _read_cache(cache_path)
+    if header is None or header.get('path') != path:
+        header = {}
+    if any(header.get(k) != v for k, v in source.items()):
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        if header.get('sha256') != digest:
+            words = parse(data.decode('utf8'))
+        if not words:
+            raise ValueError('no words in ' + path)
+        header = dict(source, version=CACHE_VERSION, sha256=digest, count=len(words))
+        _write_cache(cache_path, header, words)
+    _loaded[path] = (source, words)
+    return words
+
+def _read_cache(cache_path):
+    if cache_path is None or not os.path.isfile(cache_path):
+        return None, None
+    try:
+        with open(cache_path, encoding='utf8') as f:
+            header = json.loads(f.readline())
+            words = f.read().split('\n')[:-1]
+    except (OSError, ValueError):
+        return None, None
+    if header.get('version') != CACHE_VERSION or header.get('count') != len(words):
+        return None, None
+    return header, words
+
+def _write_cache(cache_path, header, words):
+    if cache_path is None:
+        return
+    data = json.dumps(header) + '\n' + ''.join(word + '\n' for word in words)
+    try:
+        atomic.write_file(cache_path, data.encode('utf8'))
+    except OSError:
+        # the cache only saves time, the wordlist was parsed already
+        pass
@@ -1,4 +1,16 @@
 # __init__.py
 from . import main_test
 from . import crypto_test
-from . import trezor_test
\ No newline at end of file
+from . import trezor_test
+from . import agent_test
+from . import daemon_test
+from . import cache_test
+from . import index_test
+from . import completion_test
+from . import pattern_test
+from . import journal_test
+from . import atomic_test
+from . import transfer_test
+from . import simulator_test
+from . import wordlist_test
+from . import timing_test
\ No newline at end of file
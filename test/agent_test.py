@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import pytest
+import os
+import threading
+import time
+from src import agent
+
+@pytest.fixture
+def key_agent(tmp_path):
+    sock_path = str(tmp_path / 'agent.sock')
+    a = agent.KeyAgent(sock_path, 1)
+    t = threading.Thread(target=a.serve)
+    t.start()
+    while not agent.is_running(sock_path):
+        time.sleep(0.01)
+    yield sock_path
+    agent.stop(sock_path)
+    t.join()
+
+def test_put_get_keys(key_agent):
+    assert agent.get_keys(key_agent) is None
+    assert agent.put_keys(key_agent, ['file.pswd', 'filekey', 'enckey'])
+    assert agent.get_keys(key_agent) == ['file.pswd', 'filekey', 'enckey']
+    assert agent.forget_keys(key_agent)
+    assert agent.get_keys(key_agent) is None
+
+def test_keys_expire(key_agent):
+    agent.put_keys(key_agent, ['file.pswd', 'filekey', 'enckey'])
+    time.sleep(1.1)
+    assert agent.get_keys(key_agent) is None
+
+def test_no_agent(tmp_path):
+    sock_path = str(tmp_path / 'agent.sock')
+    assert not agent.is_running(sock_path)
+    assert agent.get_keys(sock_path) is None
+    assert not agent.put_keys(sock_path, ['file.pswd', 'filekey', 'enckey'])
+
+def test_agent_server_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        agent.AgentServer(str(tmp_path / 'agent.sock'))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import pytest
+import os
+from src import atomic
+
+def test_write_file(tmp_path):
+    path = str(tmp_path / 'test.pswd')
+    atomic.write_file(path, b'first')
+    os.chmod(path, 0o640)
+    atomic.write_file(path, memoryview(b'second'))
+    with open(path, 'rb') as f:
+        assert f.read() == b'second'
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o640)
+    assert os.listdir(str(tmp_path)) == ['test.pswd']
+
+def test_write_file_mode(tmp_path):
+    path = str(tmp_path / 'session.key')
+    atomic.write_file(path, b'key', 0o600)
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+
+def test_failed_write_keeps_file(tmp_path):
+    path = str(tmp_path / 'test.pswd')
+    atomic.write_file(path, b'first')
+    with pytest.raises(TypeError):
+        atomic.write_file(path, 'not bytes')
+    with open(path, 'rb') as f:
+        assert f.read() == b'first'
+    assert os.listdir(str(tmp_path)) == ['test.pswd']
+
+def test_open_file(tmp_path):
+    path = str(tmp_path / 'export.json')
+    atomic.write_file(path, b'old', 0o644)
+    with pytest.raises(SystemExit):
+        with atomic.open_file(path, 0o600) as f:
+            f.write(b'partial')
+            raise SystemExit(1)
+    with open(path, 'rb') as f:
+        assert f.read() == b'old'
+    assert os.listdir(str(tmp_path)) == ['export.json']
+    with atomic.open_file(path, 0o600) as f:
+        f.write(b'new')
+    with open(path, 'rb') as f:
+        assert f.read() == b'new'
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
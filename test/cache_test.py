@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import pytest
+import os
+from src import cache
+
+@pytest.fixture
+def files(tmp_path):
+    pwd_file = str(tmp_path / 'test.pswd')
+    with open(pwd_file, 'wb') as f:
+        f.write(b'encrypted store')
+    return str(tmp_path / 'test.pswd.cache'), str(tmp_path / 'session.key'), pwd_file
+
+def test_write_load(files):
+    cache_file, key_file, pwd_file = files
+    assert cache.load(cache_file, key_file, pwd_file) is None
+    cache.write(cache_file, key_file, pwd_file, {'db_json': {'entries': {}}})
+    assert oct(os.stat(cache_file).st_mode & 0o777) == oct(0o600)
+    assert oct(os.stat(key_file).st_mode & 0o777) == oct(0o600)
+    assert cache.load(cache_file, key_file, pwd_file)['db_json'] == {'entries': {}}
+    with open(cache_file, 'rb') as f:
+        assert b'entries' not in f.read()
+
+def test_stale_cache(files):
+    cache_file, key_file, pwd_file = files
+    cache.write(cache_file, key_file, pwd_file, {'db_json': {}})
+    with open(pwd_file, 'wb') as f:
+        f.write(b'changed store  ')
+    assert cache.load(cache_file, key_file, pwd_file) is None
+
+def test_touched_cache(files, monkeypatch):
+    cache_file, key_file, pwd_file = files
+    cache.write(cache_file, key_file, pwd_file, {'db_json': {}}, b'encrypted store')
+    os.utime(pwd_file, (0, 0))
+    assert cache.load(cache_file, key_file, pwd_file) is not None
+    # the new mtime was stored, the store is not hashed again
+    monkeypatch.setattr(cache, 'file_digest', None)
+    assert cache.load(cache_file, key_file, pwd_file)['mtime'] == 0
+
+def test_new_session_key(files):
+    cache_file, key_file, pwd_file = files
+    cache.write(cache_file, key_file, pwd_file, {'db_json': {}})
+    os.remove(key_file)
+    cache.session_key(key_file)
+    assert cache.load(cache_file, key_file, pwd_file) is None
+    assert cache.remove(cache_file, key_file)
+    assert not os.path.exists(cache_file)
+
+def test_journal_changed(files, tmp_path):
+    cache_file, key_file, pwd_file = files
+    journal_file = str(tmp_path / 'test.pswd.journal')
+    cache.write(cache_file, key_file, pwd_file, {'db_json': {}}, journal_file=journal_file)
+    assert cache.load(cache_file, key_file, pwd_file, journal_file) is not None
+    with open(journal_file, 'wb') as f:
+        f.write(b'record')
+    assert cache.load(cache_file, key_file, pwd_file, journal_file) is None
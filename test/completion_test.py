@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+import pytest
+import json
+import os
+from src import completion
+from src import index
+
+def test_write_complete(tmp_path):
+    path = str(tmp_path / 'test.pswd.completion')
+    tags = {'0': {'title': 'All'}, '1': {'title': 'Social'}}
+    entries = {'0': {'title': 'github.com', 'username': 'me', 'tags': [1]}, '1': {'title': 'mail', 'username': 'you', 'tags': []}}
+    completion.write(path, index.StoreIndex(entries, tags))
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+    assert completion.complete(path, completion.ENTRY, 'soc') == ['Social/github.com:me#0']
+    assert completion.complete(path, completion.ENTRY, '') == ['All/mail:you#1', 'Social/github.com:me#0']
+    assert completion.complete(path, completion.TAG, 'S') == ['Social/']
+    # titles behind the tag and usernames complete too
+    assert completion.complete(path, completion.ENTRY, 'GitHub') == ['Social/github.com:me#0']
+    assert completion.complete(path, completion.ENTRY, 'you') == ['All/mail:you#1']
+    assert completion.complete(path, completion.TAG, 'cial') == ['Social/']
+
+def test_no_index(tmp_path):
+    assert completion.complete(str(tmp_path / 'missing.completion'), completion.ENTRY, '') == []
+    assert completion.complete(None, completion.TAG, '') == []
+
+def test_locate(tmp_path):
+    config_file = str(tmp_path / 'config.json')
+    assert completion.locate(config_file, str(tmp_path)) is None
+    with open(config_file, 'w') as f:
+        json.dump({'fileName': 'test.pswd', 'storeMetaDataOnDisk': True}, f)
+    assert completion.locate(config_file, str(tmp_path)) == str(tmp_path / 'test.pswd.completion')
+    with open(config_file, 'w') as f:
+        json.dump({'fileName': 'test.pswd', 'storeMetaDataOnDisk': False}, f)
+    assert completion.locate(config_file, str(tmp_path)) is None
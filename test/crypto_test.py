@@ -3,12 +3,17 @@ import pytest
 import os
 import json
 from src import crypto
-from src import trezor
+from src import simulator
 
-client = trezor.TrezorDevice()
+client = simulator.SimulatedDevice()
+
+e_coinbase = {'title': 'coinbase.com', 'username': 'tpass@gmail.com'}
 
 def test_decryptEntryValue():
-    e_coinbase = {}
+    entropy = os.urandom(32)
+    e_coinbase['nonce'] = client.getEncryptedNonce(e_coinbase, entropy)
+    e_coinbase['password'] = {'type': 'Buffer', 'data': crypto.encryptEntryValue(crypto.getPlainNonce(entropy), json.dumps('1234'), os.urandom(12))}
+    e_coinbase['safe_note'] = {'type': 'Buffer', 'data': crypto.encryptEntryValue(crypto.getPlainNonce(entropy), json.dumps('sadsadsad'), os.urandom(12))}
     plain_nonce = client.getDecryptedNonce(e_coinbase)
     pwd = crypto.decryptEntryValue(plain_nonce, e_coinbase['password']['data'])
     assert pwd == '1234'
@@ -16,21 +21,104 @@ def test_decryptEntryValue():
     assert safeNote == 'sadsadsad'
 
 def test_encryptEntryValue():
-    e_coinbase['nonce'] = client.getEncryptedNonce(e_coinbase)
+    e_coinbase['nonce'] = client.getEncryptedNonce(e_coinbase, os.urandom(32))
     plain_nonce = client.getDecryptedNonce(e_coinbase)
-    pwd = crypto.encryptEntryValue('1234', plain_nonce)
-    assert pwd == e_coinbase['password']['data']
-    safeNote = crypto.encryptEntryValue('sadsadsad', plain_nonce)
-    assert safeNote == e_coinbase['password']['safe_note']
+    iv = os.urandom(12)
+    pwd = crypto.encryptEntryValue(plain_nonce, json.dumps('1234'), iv)
+    assert pwd[:12] == list(iv)
+    assert crypto.decryptEntryValue(plain_nonce, pwd) == '1234'
+    safeNote = crypto.encryptEntryValue(plain_nonce, json.dumps('sadsadsad'), iv)
+    assert crypto.decryptEntryValue(plain_nonce, safeNote) == 'sadsadsad'
+
+ENC_KEY = '00112233445566778899aabbccddeeff00112233445566778899aabbccddeeff'
+
+def test_decryptStorage(tmp_path):
+    store_path = str(tmp_path / 'test.pswd')
+    # multibyte characters straddling the read chunks
+    note = '\u20ac\U0001f3e0' * (crypto.READ_CHUNK_BYTES // 3)
+    db_json = {'version': '0.0.1', 'tags': {'0': {'title': 'All', 'icon': 'home'}}, 'entries': {'0': {'title': note}}}
+    crypto.encryptStorage(db_json, store_path, ENC_KEY, os.urandom(12))
+    assert crypto.decryptStorage(store_path, ENC_KEY) == db_json
 
-def test_decryptStorage():
-    return
+def test_decryptStorage_wrong_tag(tmp_path):
+    store_path = str(tmp_path / 'test.pswd')
+    crypto.encryptStorage({'entries': {}}, store_path, ENC_KEY, os.urandom(12))
+    with open(store_path, 'r+b') as f:
+        f.seek(12)
+        f.write(bytes(16))
+    with pytest.raises(Exception):
+        crypto.decryptStorage(store_path, ENC_KEY)
 
-def test_encryptStorage():
-    return
+def test_encryptStorage(tmp_path):
+    store_path = str(tmp_path / 'test.pswd')
+    iv = os.urandom(12)
+    crypto.encryptStorage({'entries': {}}, store_path, ENC_KEY, iv)
+    with open(store_path, 'rb') as f:
+        assert f.read(12) == iv
+    assert crypto.decryptStorage(store_path, ENC_KEY) == {'entries': {}}
 
 def test_generatePassword():
-    return
+    reader = crypto.EntropyReader(os.urandom, crypto.entropyBytes('password', 15, 50, len(crypto.PASSWORD_CHARS)))
+    for i in range(50):
+        pwd = crypto.generatePassword(15, reader)
+        assert len(pwd) == 15
+        assert set(pwd) <= set(crypto.PASSWORD_CHARS)
+        assert sum(c.isdigit() for c in pwd) >= 2
+
+def test_generatePassword_short():
+    assert len(crypto.generatePassword(crypto.MIN_PASSWORD_LENGTH)) == crypto.MIN_PASSWORD_LENGTH
+    with pytest.raises(ValueError):
+        crypto.generatePassword(3)
+    with pytest.raises(ValueError):
+        crypto.entropyBytes('password', 3, 1, len(crypto.PASSWORD_CHARS))
+    for length in range(crypto.MIN_PASSWORD_LENGTH, 8):
+        assert 0 < crypto.entropyBytes('password', length, 1000, len(crypto.PASSWORD_CHARS)) <= crypto.MAX_ENTROPY_BLOCK
 
 def test_generatePassphrase():
-    return
+    words = ['w' + str(i) for i in range(7776)]
+    passphrase = crypto.generatePassphrase(8, words, ' ').split(' ')
+    assert len(passphrase) == 8
+    assert set(passphrase) <= set(words)
+
+def test_generatePin():
+    pin = crypto.generatePin(6)
+    assert len(pin) == 6 and pin.isdigit()
+
+def test_EntropyReader_rejection():
+    # 250 to 255 are past the last multiple of 10 and must be skipped
+    reader = crypto.EntropyReader(lambda n: bytes([255, 250, 13, 9] * n))
+    assert reader.indices(10, 4) == [3, 9, 3, 9]
+    # two bytes per index for the wordlist size
+    reader = crypto.EntropyReader(lambda n: bytes([0, 1] * n))
+    assert reader.indices(7776, 3) == [1, 1, 1]
+
+def test_EntropyReader_one_block():
+    requests = []
+    def source(n):
+        requests.append(n)
+        return os.urandom(n)
+    reader = crypto.EntropyReader(source, crypto.entropyBytes('pin', 6, 1000, 10))
+    for i in range(1000):
+        crypto.generatePin(6, reader)
+    assert len(requests) == 1
+
+def test_EntropyReader_block_cap():
+    requests = []
+    def source(n):
+        requests.append(n)
+        return os.urandom(n)
+    reader = crypto.EntropyReader(source, crypto.entropyBytes('password', 20, 5000, len(crypto.PASSWORD_CHARS)))
+    for i in range(5000):
+        crypto.generatePassword(20, reader)
+    assert max(requests) <= crypto.MAX_ENTROPY_BLOCK
+    assert len(requests) > 1
+
+def test_entryValue_encodings():
+    nonce = os.urandom(32).hex()
+    for encoding in crypto.ENTRY_ENCODINGS:
+        val = crypto.encryptEntryValue(nonce, json.dumps('pässword'), os.urandom(12), encoding)
+        assert crypto.decryptEntryValue(nonce, val) == 'pässword'
+    buf = crypto.encryptEntryValue(nonce, json.dumps('1234'), os.urandom(12))
+    assert isinstance(buf, list)
+    b64 = crypto.encodeEntryValue(crypto.decodeEntryValue(buf), 'base64')
+    assert crypto.decodeEntryValue(b64) == bytes(buf)
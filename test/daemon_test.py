@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import pytest
+import socket
+import threading
+import time
+from src import daemon
+
+class StubDevice:
+    client = None
+
+    def getTrezorKeys(self):
+        return ['file.pswd', 'filekey', 'enckey']
+
+    def getEntropyChunks(self, lengths):
+        return [bytes(length) for length in lengths]
+
+    def getEncryptedNonce(self, entry, entropy):
+        return entry['title'] + entropy.hex()
+
+    def getEncryptedNonces(self, entries, entropies):
+        return [self.getEncryptedNonce(e, x) for e, x in zip(entries, entropies)]
+
+    def getDecryptedNonces(self, entries):
+        return [e['nonce'][::-1] for e in entries]
+
+    def iterDecryptedNonces(self, entries):
+        self.streamed = getattr(self, 'streamed', 0) + 1
+        for e in entries:
+            if e['nonce'] == 'fail':
+                raise ValueError('device error')
+            yield e['nonce'][::-1]
+
+    def disconnect(self):
+        self.client = None
+
+@pytest.fixture
+def remote(tmp_path):
+    sock_path = str(tmp_path / 'daemon.sock')
+    d = daemon.DeviceDaemon(sock_path, StubDevice())
+    t = threading.Thread(target=d.serve)
+    t.start()
+    while not daemon.is_running(sock_path):
+        time.sleep(0.01)
+    remote = daemon.RemoteDevice(sock_path)
+    remote.device = d.device
+    yield remote
+    daemon.stop(sock_path)
+    t.join()
+
+def test_remote_device(remote):
+    entry = {'title': 'a', 'username': 'u', 'nonce': 'abcd', 'password': {'type': 'Buffer', 'data': [1, 2]}}
+    assert remote.getTrezorKeys() == ['file.pswd', 'filekey', 'enckey']
+    assert remote.getEntropyChunks([2, 4]) == [bytes(2), bytes(4)]
+    assert remote.getEntropy(4) == bytes(4)
+    assert remote.getEncryptedNonce(entry, b'\x01') == 'a01'
+    assert remote.getEncryptedNonces([entry, entry], [b'\x01', b'\x02']) == ['a01', 'a02']
+    assert remote.getDecryptedNonce(entry) == 'dcba'
+    assert list(remote.iterDecryptedNonces([entry, entry])) == ['dcba', 'dcba']
+
+def test_remote_device_error(remote):
+    with pytest.raises(RuntimeError):
+        remote.getEntropyChunks(None)
+
+def test_remote_device_streams_nonces(remote):
+    entries = [{'title': 'a', 'username': 'u', 'nonce': 'ab' + str(i)} for i in range(3)]
+    assert list(remote.iterDecryptedNonces(entries)) == ['0ba', '1ba', '2ba']
+    # one request for all entries
+    assert remote.device.streamed == 1
+    failing = entries[:1] + [{'title': 'b', 'username': 'u', 'nonce': 'fail'}]
+    nonces = remote.iterDecryptedNonces(failing)
+    assert next(nonces) == '0ba'
+    with pytest.raises(RuntimeError):
+        next(nonces)
+    assert daemon.is_running(remote.sock_path)
+
+def test_stalled_client(remote, monkeypatch):
+    monkeypatch.setattr(daemon.agent, 'CONNECTION_TIMEOUT', 0.2)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(remote.sock_path)
+        # sends no request, the daemon moves on after the timeout
+        assert remote.getTrezorKeys() == ['file.pswd', 'filekey', 'enckey']
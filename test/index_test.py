@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import pytest
+from src import index
+
+@pytest.fixture
+def store_index():
+    tags = {'0': {'title': 'All', 'icon': 'home'}, '1': {'title': 'Social', 'icon': 'person'}, '2': {'title': 'Work', 'icon': 'star'}}
+    entries = {
+        '0': {'title': 'github.com', 'username': 'me', 'tags': [1]},
+        '1': {'title': 'github.com', 'username': 'you', 'tags': [1, 2]},
+        '2': {'title': 'Google.com', 'username': 'me', 'tags': []},
+    }
+    return index.StoreIndex(entries, tags)
+
+def test_find_entry(store_index):
+    assert store_index.find_entry('github.com') == '0'
+    assert store_index.find_entry('github.com', 'you') == '1'
+    assert store_index.find_entry('github.com', 'nobody') is None
+    assert store_index.find_entry('gitlab.com') is None
+
+def test_find_tag(store_index):
+    assert store_index.find_tag('Work') == '2'
+    assert store_index.find_tag('Private') is None
+
+def test_entry_ids_by_tag(store_index):
+    assert store_index.entry_ids_by_tag('1') == ['0', '1']
+    assert store_index.entry_ids_by_tag(2) == ['1']
+    assert store_index.entry_ids_by_tag('0') == ['2']
+
+def test_update_entry(store_index):
+    store_index.update_entry('1', {'title': 'gitlab.com', 'username': 'you', 'tags': []})
+    assert store_index.find_entry('github.com', 'you') is None
+    assert store_index.find_entry('gitlab.com') == '1'
+    assert store_index.entry_ids_by_tag('2') == []
+    assert store_index.entry_ids_by_tag('0') == ['2', '1']
+    store_index.remove_entry('1')
+    assert store_index.find_entry('gitlab.com') is None
+
+def test_complete(store_index):
+    assert store_index.complete_entries('soc') == ['Social/github.com:me#0', 'Social/github.com:you#1']
+    assert store_index.complete_entries('all/g') == ['All/Google.com:me#2']
+    assert store_index.complete_tags('') == ['All/', 'Social/', 'Work/']
+    store_index.update_tag('2', {'title': 'Job', 'icon': 'star'})
+    assert store_index.complete_tags('w') == []
+    assert store_index.complete_entries('job') == ['Job/github.com:you#1']
+    assert store_index.find_tag('Job') == '2'
+
+def test_complete_substring(store_index):
+    # the title sits behind the tag
+    assert store_index.complete_entries('github') == ['Social/github.com:me#0', 'Social/github.com:you#1', 'Work/github.com:you#1']
+    assert store_index.complete_entries('GOOGLE') == ['All/Google.com:me#2']
+    assert store_index.complete_entries(':you#') == ['Social/github.com:you#1', 'Work/github.com:you#1']
+    assert store_index.complete_tags('ork') == ['Work/']
+
+@pytest.fixture
+def search_index():
+    entries = {
+        '0': {'title': 'github.com', 'username': 'me', 'note': ''},
+        '1': {'title': 'gitlab.com', 'username': 'me', 'note': 'work account'},
+        '2': {'title': 'Google.com', 'username': 'you', 'note': 'old github login'},
+    }
+    return index.SearchIndex(entries)
+
+def test_search_ranking(search_index):
+    assert search_index.search('github') == ['0', '2']
+    assert search_index.search('git') == ['0', '1', '2']
+    assert search_index.search('hub') == ['0', '2']
+    assert search_index.search('me com') == ['0', '1']
+    assert search_index.search('nothing') == []
+    assert search_index.search('') == []
+
+def test_search_fuzzy(search_index):
+    assert search_index.search('gogle') == ['2']
+    assert search_index.search('gogle', fuzzy=False) == []
+
+def test_search_substring(search_index):
+    assert search_index.search('it') == ['0', '1', '2']
+    assert search_index.search('ub') == ['0', '2']
+    assert search_index.search('b.c') == ['0', '1']
+    assert search_index.search('github.com') == ['0']
+    assert search_index.search('b.c me') == ['0', '1']
+    assert search_index.search('b.c you') == []
+    assert search_index.search('e.co') == ['2']
+
+def test_search_update(search_index):
+    search_index.update_entry('1', {'title': 'gitea.io', 'username': 'me', 'note': ''})
+    assert search_index.search('gitlab') == []
+    assert search_index.search('gitea') == ['1']
+    search_index.remove_entry('1')
+    assert search_index.search('gitea') == []
+    assert 'gitea' not in search_index.postings
+
+def test_new_ids(store_index):
+    assert store_index.new_entry_id() == '3'
+    assert store_index.new_tag_id() == '3'
+    store_index.add_entry('10', {'title': 'a', 'username': '', 'tags': []})
+    store_index.add_entry('9', {'title': 'b', 'username': '', 'tags': []})
+    assert store_index.new_entry_id() == '11'
+    store_index.remove_entry('10')
+    assert store_index.new_entry_id() == '11'
+    assert index.StoreIndex({}, {}).new_entry_id() == '0'
+
+def test_sort_orders(store_index):
+    store_index.add_entry('10', {'title': 'a.com', 'username': '', 'tags': [2]})
+    store_index.add_entry('9', {'title': 'z.com', 'username': '', 'tags': [2]})
+    assert store_index.entry_ids('date') == ['0', '1', '2', '9', '10']
+    assert store_index.entry_ids('title') == ['2', '10', '0', '1', '9']
+    assert store_index.entry_ids_by_tag('2', 'date') == ['1', '9', '10']
+    assert store_index.entry_ids_by_tag('2', 'title') == ['10', '1', '9']
+    store_index.update_entry('10', {'title': 'zz.com', 'username': '', 'tags': []})
+    assert store_index.entry_ids('title') == ['2', '0', '1', '9', '10']
+    store_index.remove_entry('9')
+    assert store_index.entry_ids('date') == ['0', '1', '2', '10']
+    assert store_index.tag_ids('title') == ['0', '1', '2']
+    store_index.update_tag('1', {'title': 'Zoo', 'icon': 'home'})
+    assert store_index.tag_ids('title') == ['0', '2', '1']
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+import pytest
+import hashlib
+from src import journal
+
+DIGEST = hashlib.sha256(b'encrypted store').hexdigest()
+
+@pytest.fixture
+def journal_file(tmp_path):
+    path = str(tmp_path / 'test.pswd.journal')
+    journal.create(path, DIGEST)
+    return path
+
+def test_append_read(journal_file):
+    assert journal.read(journal_file, DIGEST) == []
+    journal.append(journal_file, b'first')
+    journal.append(journal_file, b'second')
+    assert journal.read(journal_file, DIGEST) == [b'first', b'second']
+    assert journal.read(journal_file, hashlib.sha256(b'other store').hexdigest()) is None
+
+def test_torn_record(journal_file):
+    journal.append(journal_file, b'first')
+    with open(journal_file, 'ab') as f:
+        f.write(journal.RECORD_LENGTH.pack(100) + b'cut off')
+    assert journal.read(journal_file, DIGEST) == [b'first']
+    journal.append(journal_file, b'second')
+    assert journal.read(journal_file, DIGEST) == [b'first', b'second']
+
+def test_apply():
+    db_json = {'entries': {'0': {'title': 'a'}, '1': {'title': 'b'}}, 'tags': {'0': {'title': 'All'}}}
+    journal.apply(db_json, {'entries': {'1': None, '2': {'title': 'c'}}, 'tags': {'1': {'title': 'Work'}}})
+    assert db_json == {'entries': {'0': {'title': 'a'}, '2': {'title': 'c'}}, 'tags': {'0': {'title': 'All'}, '1': {'title': 'Work'}}}
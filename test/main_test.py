@@ -7,8 +7,11 @@ import os
 import tempfile
 import shutil
 import subprocess
+import threading
+import time
 import unittest
 from src import main
+from src import simulator
 from src import trezor as trezorapi
 
 
@@ -59,5 +62,192 @@ class Tests_main(unittest.TestCase):
             assert "is not empty, not initialized" in result.output
             shutil.rmtree(DEFAULT_PATH)
 
+class Tests_remove(unittest.TestCase):
+    """
+    Testing removal of entries and tags without device
+    """
+    def setUp(self):
+        main.tags = {'0': {'title': 'All'}, '1': {'title': 'Work'}, '2': {'title': 'Home'}}
+        main.entries = {
+            '1': {'title': 'a.com', 'username': 'a', 'tags': [1]},
+            '2': {'title': 'b.com', 'username': 'b', 'tags': [1, 2]},
+            '3': {'title': 'c.com', 'username': 'c', 'tags': [2]},
+            '4': {'title': 'd.com', 'username': 'd', 'tags': []}}
+        main.store_index = main.index.StoreIndex(main.entries, main.tags)
+        main.changes = {'entries': {}, 'tags': {}}
+
+    def test_remove_items(self):
+        main.remove_items(['4'], ['1'])
+        assert sorted(main.entries) == ['1', '2', '3']
+        assert '1' not in main.tags
+        assert main.entries['1']['tags'] == []
+        assert main.entries['2']['tags'] == [2]
+        assert sorted(main.store_index.entry_ids_by_tag('2')) == ['2', '3']
+        assert sorted(main.changes['entries']) == ['1', '2', '4']
+        assert list(main.changes['tags']) == ['1']
+
+    def test_remove_items_recursive(self):
+        main.remove_items(['2'], ['1', '2'], True)
+        assert list(main.entries) == ['4']
+        assert sorted(main.tags) == ['0']
+        assert main.store_index.entry_ids(main.order_type()) == ['4']
+
+class StubClient:
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.sent = 0
+
+    def iterDecryptedNonces(self, entries):
+        for i, entry in enumerate(entries):
+            if i == self.fail_at:
+                raise RuntimeError('device gone')
+            self.sent += 1
+            yield entry['nonce']
+
+class BlockingClient:
+    '''Waits for a confirmation on the device from the fourth entry on'''
+    def __init__(self):
+        self.confirmed = threading.Event()
+
+    def iterDecryptedNonces(self, entries):
+        for i, entry in enumerate(entries):
+            if i >= 3:
+                self.confirmed.wait(5)
+            yield entry['nonce']
+
+class Tests_match_entries(unittest.TestCase):
+    """
+    Testing the decryption pipeline of grep with a stub device
+    """
+    def setUp(self):
+        self.client = main.client
+        self.decrypt_entry_values = main.decrypt_entry_values
+        def decrypt_entry_values(e, plain_nonce):
+            # later entries finish first
+            time.sleep(0.001 * (20 - int(e[0]) % 20))
+            e[1]['export'] = True
+            e[1]['password']['data'] = plain_nonce
+            return e
+        main.decrypt_entry_values = decrypt_entry_values
+
+    def tearDown(self):
+        main.client = self.client
+        main.decrypt_entry_values = self.decrypt_entry_values
+
+    def entries(self, n):
+        return [(str(i), {'export': False, 'nonce': 'n' + str(i), 'password': {'data': ''}}) for i in range(n)]
+
+    def test_order(self):
+        main.client = StubClient()
+        results = list(main.match_entries(self.entries(40), lambda e: e[1]['password']['data']))
+        assert [e[0] for e, match in results] == [str(i) for i in range(40)]
+        assert [match for e, match in results] == ['n' + str(i) for i in range(40)]
+
+    def test_device_error(self):
+        main.client = StubClient(fail_at=5)
+        results = []
+        with self.assertRaises(SystemExit) as cm:
+            for e, match in main.match_entries(self.entries(40), lambda e: True):
+                results.append(e[0])
+        assert cm.exception.code == main.ERROR_CODES['TREZOR_DEVICE_ERROR']['code']
+        assert results == ['0', '1', '2', '3', '4']
+
+    def test_early_stop(self):
+        main.client = StubClient()
+        threads = threading.active_count()
+        matches = main.match_entries(self.entries(200), lambda e: True)
+        next(matches)
+        next(matches)
+        matches.close()
+        assert threading.active_count() == threads
+        assert main.client.sent <= 2 + 2 * main.LOOKAHEAD
+
+    def test_early_stop_blocked_device(self):
+        main.client = BlockingClient()
+        matches = main.match_entries(self.entries(10), lambda e: True)
+        next(matches)
+        start = time.monotonic()
+        matches.close()
+        assert time.monotonic() - start < 1
+        main.client.confirmed.set()
+
+class Tests_export(unittest.TestCase):
+    """
+    Testing export to a file with stub decryption
+    """
+    def setUp(self):
+        self.unlock_storage = main.unlock_storage
+        self.unlock_entries = main.unlock_entries
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'export.json')
+        with open(self.path, 'w') as f:
+            f.write('old')
+        os.chmod(self.path, 0o644)
+        main.tags = {'0': {'title': 'All'}}
+        main.entries = {str(i): {'title': 't' + str(i), 'username': 'u', 'note': '', 'tags': [], 'password': {'data': 'p'}, 'safe_note': {'data': 's'}} for i in range(3)}
+        main.store_index = main.index.StoreIndex(main.entries, main.tags)
+        main.unlock_storage = lambda: None
+
+    def tearDown(self):
+        main.unlock_storage = self.unlock_storage
+        main.unlock_entries = self.unlock_entries
+        shutil.rmtree(self.dir)
+
+    def test_export(self):
+        main.unlock_entries = lambda es: iter(es)
+        result = CliRunner().invoke(main.export_cmd, ['--path', self.path])
+        assert result.exit_code == 0
+        with open(self.path) as f:
+            assert [e['item/url*'] for e in json.load(f).values()] == ['t0', 't1', 't2']
+        assert oct(os.stat(self.path).st_mode & 0o777) == oct(0o600)
+        assert os.listdir(self.dir) == ['export.json']
+
+    def test_device_error(self):
+        def unlock_entries(es):
+            yield es[0]
+            main.handle_exception('TREZOR_DEVICE_ERROR')
+        main.unlock_entries = unlock_entries
+        result = CliRunner().invoke(main.export_cmd, ['--path', self.path])
+        assert result.exit_code == main.ERROR_CODES['TREZOR_DEVICE_ERROR']['code']
+        with open(self.path) as f:
+            assert f.read() == 'old'
+        assert os.listdir(self.dir) == ['export.json']
+
+class FailingDevice:
+    def getEntropy(self, n):
+        raise RuntimeError('device gone')
+
+class Tests_generate(unittest.TestCase):
+    """
+    Testing password generation without device
+    """
+    def setUp(self):
+        self.client = main.client
+
+    def tearDown(self):
+        main.client = self.client
+
+    def test_generate(self):
+        result = CliRunner().invoke(main.generate_cmd, ['--count', '3', '--type', 'pin', '8'])
+        assert result.exit_code == 0
+        assert [len(pin) for pin in result.output.split()] == [8, 8, 8]
+        result = CliRunner().invoke(main.generate_cmd, ['--force', str(main.crypto.MIN_PASSWORD_LENGTH)], input='y\n')
+        assert result.exit_code == 0
+
+    def test_too_short(self):
+        result = CliRunner().invoke(main.generate_cmd, ['3'])
+        assert result.exit_code == main.ERROR_CODES['GENERATE_LENGTH_ERROR']['code']
+
+    def test_device_entropy(self):
+        main.client = simulator.SimulatedDevice(sleep=False)
+        result = CliRunner().invoke(main.generate_cmd, ['--entropy', '--count', '2', '20'])
+        assert result.exit_code == 0
+        assert len(result.output.split()) == 2
+        main.client = FailingDevice()
+        result = CliRunner().invoke(main.generate_cmd, ['--entropy', '20'])
+        assert result.exit_code == main.ERROR_CODES['TREZOR_DEVICE_ERROR']['code']
+        result = CliRunner().invoke(main.generate_cmd, ['20'])
+        assert result.exit_code == 0
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+import pytest
+from src import pattern
+
+VALUES = ['github.com', 'me', 'old note\nsecond line', 'Hunter2', 'pw1']
+
+def test_trie_expression():
+    assert pattern.trie_expression(['ab', 'abc', 'b', 'a.']) == '(?:a(?:\\.|b(?:c)?)|b)'
+    assert pattern.trie_expression(['x']) == 'x'
+
+def test_fixed_strings():
+    matcher = pattern.compile_patterns(['hunter', 'github', 'nothing'])
+    assert pattern.matching_fields(matcher, VALUES) == [0]
+    matcher = pattern.compile_patterns(['hunter', 'github', 'a.b'], ignore_case=True)
+    assert pattern.matching_fields(matcher, VALUES) == [0, 3]
+    assert pattern.matching_fields(matcher, []) == []
+
+def test_regex():
+    matcher = pattern.compile_patterns(['^pw\\d$', 'second'], regex=True)
+    assert pattern.matching_fields(matcher, VALUES) == [2, 4]
+    matcher = pattern.compile_patterns(['^old note$'], regex=True)
+    assert pattern.matching_fields(matcher, VALUES) == []
+    matcher = pattern.compile_patterns(['hub.*me'], regex=True)
+    assert pattern.matching_fields(matcher, VALUES) == []
+    matcher = pattern.compile_patterns(['^me$', '^second'], regex=True)
+    assert pattern.matching_fields(matcher, VALUES) == [1]
+    matcher = pattern.compile_patterns(['com\\sme', 'line.hunter', 'com$'], regex=True)
+    assert pattern.matching_fields(matcher, VALUES) == [0]
+    matcher = pattern.compile_patterns(['^hunter2$'], regex=True, ignore_case=True)
+    assert pattern.matching_fields(matcher, VALUES) == [3]
+    with pytest.raises(Exception):
+        pattern.compile_patterns(['('], regex=True)
+
+def test_fields():
+    matcher = pattern.compile_patterns(['com\nme', 'm\nme'])
+    assert pattern.matching_fields(matcher, VALUES) == []
+    matcher = pattern.compile_patterns(['note\nsecond'])
+    assert pattern.matching_fields(matcher, VALUES) == [2]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import os
+import pytest
+from src import crypto
+from src import simulator
+
+ENTRY = {'title': 'https://coinbase.com/login', 'username': 'tpass@gmail.com'}
+
+def test_trezor_keys_deterministic():
+    keys = simulator.SimulatedDevice().getTrezorKeys()
+    assert keys == simulator.SimulatedDevice().getTrezorKeys()
+    assert keys[0].endswith('.pswd')
+    assert len(keys[1]) == 64 and len(keys[2]) == 64
+    assert keys != simulator.SimulatedDevice(seed=b'other').getTrezorKeys()
+
+def test_nonce_roundtrip():
+    device = simulator.SimulatedDevice()
+    entropy = os.urandom(32)
+    entry = dict(ENTRY, nonce=device.getEncryptedNonce(ENTRY, entropy))
+    assert device.getDecryptedNonce(entry) == crypto.getPlainNonce(entropy)
+    # the url is reduced to the host like on the device
+    assert device.getDecryptedNonce(dict(entry, title='coinbase.com')) == crypto.getPlainNonce(entropy)
+    assert device.getDecryptedNonce(dict(entry, username='other')) != crypto.getPlainNonce(entropy)
+
+def test_entropy():
+    device = simulator.SimulatedDevice()
+    chunks = device.getEntropyChunks([32, 12, 12] * 100)
+    assert [len(c) for c in chunks] == [32, 12, 12] * 100
+    # the device answers at most 1024 bytes per request
+    assert device.calls['GetEntropy'] == 3
+    assert len(device.getEntropy(12)) == 12
+
+def test_counters_and_latency():
+    device = simulator.SimulatedDevice(latency=0.01, confirm_delay=1.0, sleep=False)
+    device.getTrezorKeys()
+    entropies = [os.urandom(32) for i in range(3)]
+    nonces = device.getEncryptedNonces([ENTRY] * 3, entropies)
+    device.getDecryptedNonces([dict(ENTRY, nonce=n) for n in nonces])
+    assert device.calls['CipherKeyValue'] == 7
+    # master key and the three decryptions ask for confirmation
+    assert device.client.confirmations == 4
+    assert device.client.device_time == pytest.approx(7 * 0.01 + 4 * 1.0)
+    device.client.reset_counters()
+    assert sum(device.calls.values()) == 0
+
+def test_value_length():
+    device = simulator.SimulatedDevice()
+    with pytest.raises(ValueError):
+        device.getDecryptedNonce(dict(ENTRY, nonce='00' * 15))
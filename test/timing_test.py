@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import json
+import time
+from src import simulator
+from src import timing
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def test_nested_phases(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(timing.time, 'perf_counter', clock)
+    timing.reset()
+    inner = timing.timed('crypto', lambda: clock.sleep(0.03))
+    def outer():
+        clock.sleep(0.02)
+        inner()
+        clock.sleep(0.01)
+    timing.timed('disk', outer)()
+    clock.sleep(0.04)
+    r = timing.results()
+    phases = r['phases']
+    assert phases['disk']['calls'] == 1 and phases['crypto']['calls'] == 1
+    # the inner phase is not counted twice
+    assert round(phases['disk']['ms']) == 30
+    assert round(phases['crypto']['ms']) == 30
+    assert round(r['other_ms']) == 40
+    assert round(r['total_ms']) == 100
+
+def test_generator():
+    timing.reset()
+    def answers():
+        for i in range(3):
+            time.sleep(0.01)
+            yield i
+    assert list(timing.timed('device', answers)()) == [0, 1, 2]
+    phases = timing.results()['phases']
+    assert phases['device']['calls'] == 1
+    assert phases['device']['ms'] > 25
+
+def test_instrument():
+    class Device:
+        def getEntropy(self, length):
+            return bytes(length)
+    timing.reset()
+    device = Device()
+    timing.instrument(device, 'device')
+    timing.instrument(device, 'device')
+    assert device.getEntropy(4) == bytes(4)
+    assert timing.results()['phases']['device']['calls'] == 1
+
+def test_instrument_transport():
+    device = simulator.SimulatedDevice(sleep=False)
+    timing.reset()
+    timing.instrument(device, 'device')
+    timing.instrument(device, 'device')
+    # one method call, several round trips for the entropy
+    assert len(device.getEntropy(3000)) == 3000
+    assert timing.results()['phases']['device']['calls'] == sum(device.calls.values()) > 1
+
+def test_report():
+    timing.reset()
+    timing.timed('git', lambda: None)()
+    r = json.loads(timing.report('json'))
+    assert set(r['phases']) == set(timing.PHASES)
+    assert r['phases']['git']['calls'] == 1
+    text = timing.report()
+    assert text.splitlines()[0].split() == ['phase', 'calls', 'ms', '%']
+    assert 'total' in text
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import pytest
+import io
+import json
+from src import transfer
+
+ROWS = [
+    {'item/url*': 'github.com', 'title': 'note', 'username': 'me', 'password': 'päss,word', 'secret': 'line\nbreak', 'tags': 'Work'},
+    {'item/url*': 'google.com', 'title': '', 'username': 'you', 'password': '{"x": 1}', 'secret': '', 'tags': ''},
+]
+
+def test_detect_format():
+    assert transfer.detect_format('export.CSV') == 'csv'
+    assert transfer.detect_format('export.jsonl') == 'jsonl'
+    assert transfer.detect_format('export.json') == 'json'
+
+def test_iter_json(monkeypatch):
+    # values straddling the read chunks
+    monkeypatch.setattr(transfer, 'READ_CHUNK_CHARS', 7)
+    legacy = json.dumps({str(i): row for i, row in enumerate(ROWS)}, indent=4)
+    assert list(transfer.iter_json(io.StringIO(legacy))) == ROWS
+    assert list(transfer.iter_json(io.StringIO(json.dumps(ROWS)))) == ROWS
+    assert list(transfer.iter_json(io.StringIO(' { } '))) == []
+    with pytest.raises(ValueError):
+        list(transfer.iter_json(io.StringIO('{"0": {"item/url*": "github.com"')))
+
+def test_read_rows():
+    jsonl = io.StringIO(''.join(json.dumps(row) + '\n' for row in ROWS) + '\n')
+    assert list(transfer.read_rows(jsonl, 'jsonl')) == ROWS
+    csv_file = io.StringIO(newline='')
+    csv_file.write('item/url*,title,username,password,secret,tags\r\n')
+    csv_file.write('github.com,note,me,"päss,word","line\nbreak",Work\r\ngoogle.com,,you,"{""x"": 1}",,\r\n')
+    csv_file.seek(0)
+    assert list(transfer.read_rows(csv_file, 'csv')) == ROWS
+
+def test_batches():
+    assert list(transfer.batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+def test_validate():
+    transfer.validate(ROWS)
+    with pytest.raises(ValueError, match='row 4: missing secret'):
+        transfer.validate([ROWS[0], {'item/url*': 'a', 'username': '', 'password': ''}], 3)
+    with pytest.raises(ValueError, match='row 1: no string tags'):
+        transfer.validate([dict(ROWS[0], tags=['Work'])])
+    with pytest.raises(ValueError, match='mandatory'):
+        transfer.validate([dict(ROWS[0], **{'item/url*': ''})])
+
+def test_export_writer():
+    for file_format in transfer.FORMATS:
+        f = io.StringIO(newline='')
+        writer = transfer.ExportWriter(f, file_format)
+        for i, row in enumerate(ROWS):
+            writer.write(i, row)
+        writer.close()
+        f.seek(0)
+        assert list(transfer.read_rows(f, file_format)) == ROWS
+    f = io.StringIO()
+    transfer.ExportWriter(f, 'json').close()
+    assert json.loads(f.getvalue()) == {}
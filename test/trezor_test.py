@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import pytest
+import trezorlib.misc
 from src import trezor
 
 client = trezor.TrezorDevice()
@@ -17,4 +18,31 @@ def test_getEncryptedNonce():
     return
 
 def test_getDecryptedNonce():
-    return
\ No newline at end of file
+    return
+
+def test_getEntropyChunks(monkeypatch):
+    device = trezor.TrezorDevice()
+    device.client = object()
+    monkeypatch.setattr(trezorlib.misc, 'get_entropy', lambda client, size: b'\x01' * size)
+    chunks = device.getEntropyChunks([32, 12, 12])
+    assert [len(c) for c in chunks] == [32, 12, 12]
+    for c in chunks:
+        assert c[:len(c)//2] == b'\x01' * (len(c)//2)
+
+def test_getEntropyChunks_large(monkeypatch):
+    device = trezor.TrezorDevice()
+    device.client = object()
+    sizes = []
+    def get_entropy(client, size):
+        sizes.append(size)
+        return b'\x01' * min(size, trezor.MAX_ENTROPY_REQUEST)
+    monkeypatch.setattr(trezorlib.misc, 'get_entropy', get_entropy)
+    chunks = device.getEntropyChunks([32, 12, 12] * 100)
+    assert [len(c) for c in chunks] == [32, 12, 12] * 100
+    assert sizes == [1024, 1024, 752]
+
+def test_getEntropyChunks_odd(monkeypatch):
+    device = trezor.TrezorDevice()
+    device.client = object()
+    monkeypatch.setattr(trezorlib.misc, 'get_entropy', lambda client, size: b'\x01' * size)
+    assert [len(c) for c in device.getEntropyChunks([1, 7, 12])] == [1, 7, 12]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import os
+import pytest
+from src import crypto
+from src import wordlist
+
+def test_parse():
+    text = '11111\tabacus\n11112\tabdomen\n11111\tagain\nnot a\tdice line\n\n'
+    assert wordlist.parse(text) == ['abacus', 'abdomen']
+    assert wordlist.parse('one\ntwo\n three \n') == ['one', 'two', 'three']
+
+def test_parse_default_wordlist():
+    with open('wordlist.txt') as f:
+        words = wordlist.parse(f.read())
+    assert len(words) == 7776
+    assert words[0] == 'abacus'
+
+def test_load_cache(tmp_path):
+    path = str(tmp_path / 'wordlist.txt')
+    cache_path = wordlist.cache_file(str(tmp_path))
+    with open(path, 'w') as f:
+        f.write('1\tone\n2\ttwo\n')
+    assert wordlist.load(path, cache_path) == ['one', 'two']
+    assert os.path.isfile(cache_path)
+    wordlist._loaded.clear()
+    assert wordlist.load(path, cache_path) == ['one', 'two']
+    # changed wordlist of another size
+    with open(path, 'w') as f:
+        f.write('alpha\nbeta\ngamma\n')
+    os.utime(path, ns=(1, 1))
+    assert wordlist.load(path, cache_path) == ['alpha', 'beta', 'gamma']
+    wordlist._loaded.clear()
+    assert wordlist.load(path, cache_path) == ['alpha', 'beta', 'gamma']
+
+def test_load_empty(tmp_path):
+    path = str(tmp_path / 'wordlist.txt')
+    with open(path, 'w') as f:
+        f.write('\n')
+    with pytest.raises(ValueError):
+        wordlist.load(path)
+
+def test_generatePassphrase():
+    words = ['alpha', 'beta', 'gamma']
+    passphrase = crypto.generatePassphrase(6, words, '-').split('-')
+    assert len(passphrase) == 6
+    assert set(passphrase) <= set(words)